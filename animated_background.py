@@ -0,0 +1,88 @@
+import os
+import math
+import zlib
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from config import Config
+from ffmpeg_utils import loop_video
+
+class AnimatedBackgroundGenerator:
+    """Render moving-gradient backgrounds from precomputed coordinate grids"""
+
+    # Gradient phase advances 0.5 rad/s and 0.01 rad per pixel along x + y
+    TIME_FREQUENCY = 0.5
+    SPATIAL_FREQUENCY = 0.01
+
+    def __init__(self, width=None, height=None, fps=None):
+        self.width = width or Config.VIDEO_WIDTH
+        self.height = height or Config.VIDEO_HEIGHT
+        self.fps = fps or Config.VIDEO_FPS
+
+        # The gradient only depends on x + y, so one ramp over every diagonal
+        # holds all the pixel values of a frame
+        self.diagonal_phase = np.arange(self.width + self.height - 1) * self.SPATIAL_FREQUENCY
+
+    def get_period_frames(self):
+        """Number of frames in one full period of the gradient animation"""
+        period = 2 * math.pi / self.TIME_FREQUENCY
+        return max(1, int(round(period * self.fps)))
+
+    def get_seed_phase(self, seed_source):
+        """Stable per-video phase offset so each background looks different"""
+        seed = zlib.crc32(str(seed_source).encode("utf-8")) % 1000
+        return seed * 0.1
+
+    def make_frame(self, phase):
+        """Build one RGB frame for the given animation phase"""
+        intensity = (128 + 64 * np.sin(self.diagonal_phase + phase)).astype(np.uint8)
+        colors = np.ascontiguousarray(np.stack([intensity, intensity // 2, intensity // 3], axis=1))
+        # Row y is the ramp starting at diagonal y, so the frame is a strided view
+        return as_strided(
+            colors,
+            shape=(self.height, self.width, 3),
+            strides=(3, 3, 1),
+            writeable=False
+        )
+
+    def render(self, output_path, duration=None, seed_source=None):
+        """Render one period of the gradient and loop it to the requested duration"""
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+        if duration is None:
+            duration = Config.MAX_DURATION
+
+        seed_phase = self.get_seed_phase(seed_source if seed_source is not None else output_path)
+        period_frames = self.get_period_frames()
+        total_frames = int(math.ceil(duration * self.fps))
+        needs_loop = total_frames > period_frames
+
+        if needs_loop:
+            base, ext = os.path.splitext(output_path)
+            period_path = f"{base}_period{ext}"
+            frames_to_render = period_frames
+        else:
+            period_path = output_path
+            frames_to_render = total_frames
+
+        # Stream frames straight into the encoder instead of building a clip
+        writer = FFMPEG_VideoWriter(
+            period_path,
+            (self.width, self.height),
+            self.fps,
+            codec='libx264'
+        )
+        try:
+            for frame_index in range(frames_to_render):
+                phase = 2 * math.pi * frame_index / period_frames + seed_phase
+                writer.write_frame(self.make_frame(phase))
+        finally:
+            writer.close()
+
+        if needs_loop:
+            try:
+                loop_video(period_path, output_path, duration)
+            finally:
+                if os.path.exists(period_path):
+                    os.remove(period_path)
+
+        return output_path
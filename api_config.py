@@ -6,17 +6,356 @@ Use this to manage your API keys and switch between different providers
 
 import os
 import json
+import time
+import datetime
+import hashlib
+import itertools
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from config import Config
+from rate_limit import TokenBucket
+from file_lock import FileLock, read_json, write_json
 
 load_dotenv()
 
+def get_key_fingerprint(key):
+    """Short stable ID for a key, so state files never contain the key itself"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+
+class KeyLease:
+    """A key checked out of a KeyPool; report usage and failures through it"""
+    
+    def __init__(self, pool, key, lease_id, cost=0):
+        self.pool = pool
+        self.key = key
+        self.lease_id = lease_id
+        self.cost = cost
+        self.usage = None
+    
+    def record_usage(self, amount=None):
+        """Charge the request to the key's quota: amount billed, or the reserved cost"""
+        self.usage = amount if amount is not None else self.cost
+    
+    def mark_rate_limited(self, retry_after=None):
+        """The provider returned 429: rest the key for retry_after seconds or the default cooldown"""
+        self.pool.set_cooldown(self.key, retry_after or Config.KEY_RATE_LIMIT_COOLDOWN, drain=True)
+    
+    def mark_invalid(self):
+        """The provider rejected the key (401/403): rest it for much longer"""
+        self.pool.set_cooldown(self.key, Config.KEY_INVALID_COOLDOWN)
+
+class KeyPool:
+    """Schedules requests across a provider's API keys
+    
+    Each key has a token bucket, a cap on requests in flight and a cooldown
+    after rate-limit or auth errors. The state lives in a file-locked JSON
+    file, so threads and worker processes share the same limits. With a
+    ledger, keys are also picked by remaining quota (counted in unit) and
+    skipped when a request's cost no longer fits.
+    """
+    
+    def __init__(self, name, get_keys, requests_per_minute, max_in_flight, state_path=None,
+                 ledger=None, get_quota=None, unit="requests"):
+        self.name = name
+        self.get_keys = get_keys
+        self.requests_per_minute = requests_per_minute
+        self.max_in_flight = max_in_flight
+        self.state_path = state_path or os.path.join(Config.CACHE_DIR, "keys", f"{name}_state.json")
+        self.file_lock = FileLock(f"{self.state_path}.lock")
+        self.lease_count = itertools.count()
+        self.ledger = ledger
+        self.get_quota = get_quota or (lambda key: None)
+        self.unit = unit
+    
+    def has_keys(self):
+        """Whether any key is configured"""
+        # Unset keys fall back to [''], which is not a key
+        return any(self.get_keys())
+    
+    def get_remaining_quota(self, keys=None):
+        """Quota left this period per key (inf without a ledger or limit)"""
+        keys = [key for key in (keys or self.get_keys()) if key]
+        if not self.ledger:
+            return {key: float('inf') for key in keys}
+        return self.ledger.get_remaining(self.name, keys, self.get_quota)
+    
+    def has_capacity(self, cost, part_cost=None):
+        """Whether the keys have quota left for a request costing cost; says so when they do not
+
+        For work split into separately leased parts, pass the largest part as
+        part_cost: the keys' combined quota must cover cost and some key must
+        fit part_cost, rather than one key covering all of it.
+        """
+        remaining = self.get_remaining_quota()
+        if part_cost is None:
+            if any(left >= cost for left in remaining.values()):
+                return True
+        elif sum(remaining.values()) >= cost and any(left >= part_cost for left in remaining.values()):
+            return True
+        print(f"❌ No {self.name} quota left for {cost} {self.unit} "
+              f"(most left on one key: {max(remaining.values(), default=0):.0f}, "
+              f"total: {sum(remaining.values()):.0f})")
+        return False
+    
+    def make_bucket(self, key_state):
+        """Token bucket restored from a key's saved state"""
+        bucket = TokenBucket.per_minute(self.requests_per_minute, clock=time.time)
+        if 'bucket' in key_state:
+            bucket.set_state(key_state['bucket'])
+        return bucket
+    
+    def load_state(self, now):
+        """Saved state per key fingerprint, without leases that have expired (caller holds the lock)"""
+        state = read_json(self.state_path, {})
+        for key_state in state.values():
+            # Leases left behind by crashed processes expire instead of blocking the key forever
+            key_state['leases'] = {
+                lease_id: expires for lease_id, expires in key_state.get('leases', {}).items() if expires > now
+            }
+        return state
+    
+    def try_acquire(self, exclude=(), cost=0):
+        """(KeyLease, 0) for the best available key, or (None, seconds to wait); None wait means no usable key"""
+        keys = [key for key in self.get_keys() if key and key not in exclude]
+        remaining = self.get_remaining_quota(keys) if cost else {}
+        if cost:
+            keys = [key for key in keys if remaining[key] >= cost]
+        if not keys:
+            return None, None
+        
+        now = time.time()
+        with self.file_lock:
+            state = self.load_state(now)
+            best = None
+            wait = None
+            for key in keys:
+                key_state = state.setdefault(get_key_fingerprint(key), {'leases': {}})
+                bucket = self.make_bucket(key_state)
+                key_wait = max(key_state.get('cooldown_until', 0) - now, 0)
+                if len(key_state['leases']) >= self.max_in_flight:
+                    # A slot frees up when a request finishes; poll again shortly
+                    key_wait = max(key_wait, Config.KEY_POLL_INTERVAL)
+                key_wait = max(key_wait, bucket.get_wait_time())
+                if key_wait == 0:
+                    # Prefer the key with the most quota, then rate-limit capacity, left
+                    score = (remaining.get(key, 0), bucket.tokens, -len(key_state['leases']))
+                    if best is None or score > best[0]:
+                        best = (score, key, key_state, bucket)
+                elif wait is None or key_wait < wait:
+                    wait = key_wait
+            
+            if best is None:
+                write_json(self.state_path, state)
+                return None, wait
+            
+            _, key, key_state, bucket = best
+            lease_id = f"{os.getpid()}-{threading.get_ident()}-{next(self.lease_count)}"
+            if cost and not self.ledger.reserve(self.name, key, lease_id, cost, self.get_quota(key)):
+                # Another worker took the last of this key's quota; look again
+                write_json(self.state_path, state)
+                return None, Config.KEY_POLL_INTERVAL
+            bucket.try_acquire()
+            key_state['bucket'] = bucket.get_state()
+            key_state['leases'][lease_id] = now + Config.KEY_LEASE_TIMEOUT
+            write_json(self.state_path, state)
+        return KeyLease(self, key, lease_id, cost), 0
+    
+    def acquire(self, timeout=None, exclude=(), cost=0):
+        """Block until a key is available; None if no key is usable or timeout passes first"""
+        deadline = time.monotonic() + (timeout if timeout is not None else Config.KEY_LEASE_WAIT)
+        while True:
+            lease, wait = self.try_acquire(exclude, cost)
+            if lease:
+                return lease
+            if wait is None:
+                if cost and not exclude:
+                    self.has_capacity(cost)
+                return None
+            if time.monotonic() + wait > deadline:
+                print(f"⚠️  No {self.name} key available within the wait limit")
+                return None
+            time.sleep(wait)
+    
+    def release(self, lease):
+        """Return a leased key to the pool, settling its quota reservation"""
+        if self.ledger and (lease.cost or lease.usage):
+            self.ledger.settle(self.name, lease.key, lease.lease_id, lease.usage)
+        with self.file_lock:
+            state = self.load_state(time.time())
+            key_state = state.get(get_key_fingerprint(lease.key))
+            if key_state:
+                key_state['leases'].pop(lease.lease_id, None)
+            write_json(self.state_path, state)
+    
+    @contextmanager
+    def lease(self, timeout=None, exclude=(), cost=0):
+        """Context manager yielding a KeyLease, or None when no key is usable
+
+        cost is the expected quota use; call record_usage on the lease once
+        the request has been billed.
+        """
+        lease = self.acquire(timeout, exclude, cost)
+        try:
+            yield lease
+        finally:
+            if lease:
+                self.release(lease)
+    
+    def set_cooldown(self, key, seconds, drain=False):
+        """Keep key out of rotation for seconds, optionally emptying its bucket"""
+        now = time.time()
+        with self.file_lock:
+            state = self.load_state(now)
+            key_state = state.setdefault(get_key_fingerprint(key), {'leases': {}})
+            key_state['cooldown_until'] = max(key_state.get('cooldown_until', 0), now + seconds)
+            if drain:
+                bucket = self.make_bucket(key_state)
+                bucket.drain()
+                key_state['bucket'] = bucket.get_state()
+            write_json(self.state_path, state)
+        print(f"⏸️  {self.name} key {get_key_fingerprint(key)} cooling down for {seconds:.0f}s")
+    
+    def get_stats(self):
+        """In-flight requests and remaining cooldown per key fingerprint"""
+        now = time.time()
+        with self.file_lock:
+            state = self.load_state(now)
+        return {
+            get_key_fingerprint(key): {
+                'in_flight': len(state.get(get_key_fingerprint(key), {}).get('leases', {})),
+                'cooldown': max(0, state.get(get_key_fingerprint(key), {}).get('cooldown_until', 0) - now)
+            }
+            for key in self.get_keys() if key
+        }
+
+def get_billing_period(now=None):
+    """'YYYY-MM' of the billing period containing now; periods start on Config.QUOTA_RESET_DAY"""
+    date = datetime.date.fromtimestamp(now or time.time())
+    if date.day < Config.QUOTA_RESET_DAY:
+        date = date.replace(day=1) - datetime.timedelta(days=1)
+    return date.strftime("%Y-%m")
+
+class QuotaLedger:
+    """Characters and tokens used per key and billing period, shared by every process
+    
+    Requests reserve their expected cost when a key is leased and settle it
+    with the billed amount (or nothing, if they failed) on release, so two
+    workers can never both spend a key's last quota.
+    """
+    
+    def __init__(self, state_path=None):
+        self.state_path = state_path or os.path.join(Config.CACHE_DIR, "keys", "quota_ledger.json")
+        self.file_lock = FileLock(f"{self.state_path}.lock")
+    
+    def load_state(self, now):
+        """Saved usage without reservations that have expired (caller holds the lock)"""
+        state = read_json(self.state_path, {})
+        for provider in state.values():
+            for entry in provider.values():
+                entry['reserved'] = {
+                    lease_id: reservation for lease_id, reservation in entry.get('reserved', {}).items()
+                    if reservation['expires'] > now
+                }
+        return state
+    
+    def get_entry(self, state, provider, key):
+        """Usage entry for key, created if missing"""
+        return state.setdefault(provider, {}).setdefault(get_key_fingerprint(key), {'periods': {}, 'reserved': {}})
+    
+    def get_remaining_in(self, entry, limit, period):
+        """Quota left in period after usage and open reservations; inf without a limit"""
+        if limit is None:
+            return float('inf')
+        reserved = sum(reservation['amount'] for reservation in entry['reserved'].values())
+        return limit - entry['periods'].get(period, 0) - reserved
+    
+    def get_remaining(self, provider, keys, get_limit):
+        """Quota left this period for each key"""
+        now = time.time()
+        period = get_billing_period(now)
+        with self.file_lock:
+            state = self.load_state(now)
+        return {
+            key: self.get_remaining_in(self.get_entry(state, provider, key), get_limit(key), period)
+            for key in keys
+        }
+    
+    def reserve(self, provider, key, lease_id, amount, limit):
+        """Hold amount of key's quota for a request; False if it no longer fits"""
+        now = time.time()
+        with self.file_lock:
+            state = self.load_state(now)
+            entry = self.get_entry(state, provider, key)
+            if self.get_remaining_in(entry, limit, get_billing_period(now)) < amount:
+                return False
+            entry['reserved'][lease_id] = {'amount': amount, 'expires': now + Config.KEY_LEASE_TIMEOUT}
+            write_json(self.state_path, state)
+        return True
+    
+    def settle(self, provider, key, lease_id, amount=None):
+        """Drop a reservation and charge amount to the current period, if given"""
+        now = time.time()
+        with self.file_lock:
+            state = self.load_state(now)
+            entry = self.get_entry(state, provider, key)
+            entry['reserved'].pop(lease_id, None)
+            if amount:
+                period = get_billing_period(now)
+                entry['periods'][period] = entry['periods'].get(period, 0) + amount
+            write_json(self.state_path, state)
+    
+    def get_usage(self, provider, keys, get_limit):
+        """Current period's used, reserved, limit and remaining per key fingerprint"""
+        now = time.time()
+        period = get_billing_period(now)
+        with self.file_lock:
+            state = self.load_state(now)
+        usage = {}
+        for key in keys:
+            entry = self.get_entry(state, provider, key)
+            usage[get_key_fingerprint(key)] = {
+                'period': period,
+                'used': entry['periods'].get(period, 0),
+                'reserved': sum(reservation['amount'] for reservation in entry['reserved'].values()),
+                'limit': get_limit(key),
+                'remaining': self.get_remaining_in(entry, get_limit(key), period)
+            }
+        return usage
+
 class APIConfig:
     def __init__(self):
         self.config_file = "api_keys.json"
         self.cohere_keys = []
         self.elevenlabs_keys = []
         self.preferred_ai_provider = "cohere"
+        self.key_quotas = {}
         self.load_api_keys()
+        
+        # Keys are read on every lease so keys added at runtime join the rotation
+        self.quota_ledger = QuotaLedger()
+        self.cohere_pool = KeyPool(
+            "cohere",
+            lambda: self.cohere_keys or [Config.COHERE_API_KEY],
+            Config.COHERE_REQUESTS_PER_MINUTE,
+            Config.COHERE_MAX_IN_FLIGHT,
+            ledger=self.quota_ledger,
+            get_quota=lambda key: self.get_key_quota(key, Config.COHERE_TOKEN_QUOTA),
+            unit="tokens"
+        )
+        self.elevenlabs_pool = KeyPool(
+            "elevenlabs",
+            lambda: self.elevenlabs_keys or [Config.ELEVENLABS_API_KEY],
+            Config.ELEVENLABS_REQUESTS_PER_MINUTE,
+            Config.ELEVENLABS_MAX_IN_FLIGHT,
+            ledger=self.quota_ledger,
+            get_quota=lambda key: self.get_key_quota(key, Config.ELEVENLABS_CHARACTER_QUOTA),
+            unit="characters"
+        )
+    
+    def get_key_quota(self, key, default):
+        """Quota per billing period for key: its entry in key_quotas, or default"""
+        return self.key_quotas.get(get_key_fingerprint(key), default)
     
     def load_api_keys(self):
         """Load API keys from file"""
@@ -27,6 +366,7 @@ class APIConfig:
                     self.cohere_keys = data.get('cohere_keys', [])
                     self.elevenlabs_keys = data.get('elevenlabs_keys', [])
                     self.preferred_ai_provider = data.get('preferred_ai_provider', 'cohere')
+                    self.key_quotas = data.get('key_quotas', {})
             except Exception as e:
                 print(f"Error loading API keys: {e}")
     
@@ -36,7 +376,8 @@ class APIConfig:
             data = {
                 'cohere_keys': self.cohere_keys,
                 'elevenlabs_keys': self.elevenlabs_keys,
-                'preferred_ai_provider': self.preferred_ai_provider
+                'preferred_ai_provider': self.preferred_ai_provider,
+                'key_quotas': self.key_quotas
             }
             with open(self.config_file, 'w') as f:
                 json.dump(data, f, indent=2)
@@ -106,6 +447,25 @@ class APIConfig:
         except Exception as e:
             print(f"❌ Error removing key: {e}")
     
+    def print_usage_report(self):
+        """Show this billing period's quota use per key"""
+        print(f"\n📊 API Usage (billing period {get_billing_period()}):")
+        print("-" * 40)
+        for pool in (self.cohere_pool, self.elevenlabs_pool):
+            usage = self.quota_ledger.get_usage(pool.name, [key for key in pool.get_keys() if key], pool.get_quota)
+            if not usage:
+                print(f"No {pool.name} keys configured")
+                continue
+            print(f"{pool.name.title()} ({pool.unit}):")
+            for fingerprint, row in usage.items():
+                limit = f"{row['limit']:,}" if row['limit'] is not None else "no limit"
+                line = f"  {fingerprint}: {row['used']:,} used of {limit}"
+                if row['limit'] is not None:
+                    line += f" ({max(0, row['remaining']):,.0f} left)"
+                if row['reserved']:
+                    line += f", {row['reserved']:,} reserved"
+                print(line)
+    
     def switch_ai_provider(self):
         """Switch between AI providers"""
         self.preferred_ai_provider = "elevenlabs" if self.preferred_ai_provider == "cohere" else "cohere"
@@ -127,9 +487,10 @@ def setup_api_keys():
         print("3. List all API keys")
         print("4. Remove API key")
         print("5. Switch AI provider")
-        print("6. Exit")
+        print("6. Show API usage")
+        print("7. Exit")
         
-        choice = input("\nEnter your choice (1-6): ").strip()
+        choice = input("\nEnter your choice (1-7): ").strip()
         
         if choice == "1":
             key = input("Enter Cohere API key: ").strip()
@@ -164,6 +525,9 @@ def setup_api_keys():
             api_config.switch_ai_provider()
         
         elif choice == "6":
+            api_config.print_usage_report()
+        
+        elif choice == "7":
             print("👋 Goodbye!")
             break
         
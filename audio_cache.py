@@ -0,0 +1,64 @@
+import os
+import json
+from config import Config
+from file_cache import FileCache, link_file
+
+def get_timing_path(audio_path):
+    """Path of the timing metadata written next to a chunked voice track"""
+    return os.path.splitext(audio_path)[0] + ".timing.json"
+
+class AudioCache(FileCache):
+    """Cache of synthesized voice audio keyed by text and voice parameters
+
+    A track's timing sidecar belongs to its entry: it counts toward the
+    byte budget, is evicted with the track and is exported alongside it.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, extension=".mp3"):
+        cache_dir = cache_dir or os.path.join(Config.CACHE_DIR, "audio")
+        max_bytes = max_bytes if max_bytes is not None else Config.AUDIO_CACHE_MAX_BYTES
+        super().__init__(cache_dir, max_bytes, extension=extension)
+
+    def write_timing(self, key, timing):
+        """Write the timing sidecar for key; call before committing the track so both land together"""
+        timing_path = get_timing_path(self.path_for(key))
+        temp_path = f"{timing_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(timing, f, indent=2)
+        os.replace(temp_path, timing_path)
+
+    def get_entry_size(self, key):
+        """Bytes of the track plus its timing sidecar"""
+        size = super().get_entry_size(key)
+        timing_path = get_timing_path(self.path_for(key))
+        if os.path.exists(timing_path):
+            size += os.path.getsize(timing_path)
+        return size
+
+    def remove_entry(self, key):
+        """Delete the track and its timing sidecar"""
+        timing_path = get_timing_path(self.path_for(key))
+        if os.path.exists(timing_path):
+            os.remove(timing_path)
+        super().remove_entry(key)
+
+    def export(self, key, dest_path):
+        """Link the cached track and its timing sidecar, if any, to dest_path"""
+        timing_path = get_timing_path(self.path_for(key))
+        dest_timing_path = get_timing_path(dest_path)
+        if os.path.exists(timing_path):
+            link_file(timing_path, dest_timing_path)
+        elif os.path.exists(dest_timing_path):
+            os.remove(dest_timing_path)
+        return super().export(key, dest_path)
+
+    def make_audio_key(self, text, voice_id, model_id, voice_settings, output_format=None):
+        """Cache key for one synthesis request"""
+        return self.make_key(text, voice_id, model_id, voice_settings, output_format)
+
+    def print_stats(self):
+        """Print cache hit/miss statistics"""
+        stats = self.get_stats()
+        print(f"📦 Audio cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} files, "
+              f"{stats['bytes'] / (1024 * 1024):.1f}/{stats['max_bytes'] / (1024 * 1024):.0f} MB")
@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import math
+import struct
+import threading
+from config import Config
+
+# Bitrates in kbps indexed by [MPEG-1?][layer][bitrate index]
+MP3_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+
+# Sample rates indexed by MPEG version bits (0 = 2.5, 2 = 2, 3 = 1)
+MP3_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000]
+}
+
+def parse_mp3_frame_header(header):
+    """Decode a 4-byte MPEG audio frame header, or return None if it is not one"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    mono = (header[3] >> 6) & 0x03 == 3
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if mpeg1 or layer == 2 else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+
+    return {
+        'mpeg1': mpeg1,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'samples_per_frame': samples_per_frame,
+        'frame_length': frame_length,
+        'mono': mono
+    }
+
+def get_id3v2_size(data):
+    """Length of a leading ID3v2 tag, or 0"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def get_mp3_duration(path):
+    """Duration of an MP3 file from its frame headers and Xing/Info/VBRI tag, without decoding"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(10)
+        audio_start = get_id3v2_size(head)
+        f.seek(audio_start)
+        data = f.read(64 * 1024)
+
+        # Trailing ID3v1 tag is not audio
+        audio_end = file_size
+        if file_size >= 128:
+            f.seek(file_size - 128)
+            if f.read(3) == b"TAG":
+                audio_end -= 128
+
+    # Find the first frame whose successor also starts where the header says it should
+    frame = None
+    offset = 0
+    while offset + 4 <= len(data):
+        offset = data.find(b"\xff", offset)
+        if offset < 0 or offset + 4 > len(data):
+            return None
+        frame = parse_mp3_frame_header(data[offset:offset + 4])
+        if frame and frame['frame_length'] > 0:
+            next_offset = offset + frame['frame_length']
+            if next_offset + 4 > len(data) or parse_mp3_frame_header(data[next_offset:next_offset + 4]):
+                break
+        frame = None
+        offset += 1
+    if frame is None:
+        return None
+
+    # Xing/Info tag sits right after the side information of the first frame
+    if frame['mpeg1']:
+        side_info = 17 if frame['mono'] else 32
+    else:
+        side_info = 9 if frame['mono'] else 17
+    xing_offset = offset + 4 + side_info
+    frame_count = None
+    if data[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 0x01:
+            frame_count = struct.unpack(">I", data[xing_offset + 8:xing_offset + 12])[0]
+    elif data[offset + 36:offset + 40] == b"VBRI":
+        frame_count = struct.unpack(">I", data[offset + 50:offset + 54])[0]
+
+    if frame_count:
+        return frame_count * frame['samples_per_frame'] / frame['sample_rate']
+
+    # No VBR tag: assume constant bitrate
+    return (audio_end - audio_start - offset) * 8 / frame['bitrate']
+
+def get_wav_duration(path):
+    """Duration of a PCM WAV file from its header"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if f.read(4) != b"RIFF":
+            return None
+        f.seek(12)
+        byte_rate = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            elif chunk_id == b"data":
+                if not byte_rate:
+                    return None
+                # Streamed files may still carry the open-ended placeholder size
+                data_size = min(chunk_size, file_size - f.tell())
+                return data_size / byte_rate
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+
+def get_audio_duration(path):
+    """Duration of an audio file in seconds, probing headers before falling back to decoding"""
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(4)
+        if magic == b"RIFF":
+            duration = get_wav_duration(path)
+        else:
+            duration = get_mp3_duration(path)
+        if duration:
+            return duration
+    except (OSError, struct.error) as e:
+        print(f"⚠️  Could not probe audio headers: {e}")
+
+    from moviepy.editor import AudioFileClip
+    audio_clip = AudioFileClip(path)
+    duration = audio_clip.duration
+    audio_clip.close()
+    return duration
+
+def count_words(text):
+    """Number of spoken words in text"""
+    return len(re.findall(r"[\w']+", text))
+
+class DurationEstimator:
+    """Predict speech length from text, calibrated per voice from past runs"""
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or os.path.join(Config.CACHE_DIR, "duration_model.json")
+        self.voices = {}
+        self.lock = threading.Lock()
+        self.load_model()
+
+    def load_model(self):
+        """Load calibrated speaking rates"""
+        if not os.path.exists(self.model_path):
+            return
+        try:
+            with open(self.model_path, 'r', encoding='utf-8') as f:
+                self.voices = json.load(f).get('voices', {})
+        except Exception as e:
+            print(f"Error loading duration model: {e}")
+            self.voices = {}
+
+    def save_model(self):
+        """Atomically save calibrated speaking rates"""
+        try:
+            os.makedirs(os.path.dirname(self.model_path) or ".", exist_ok=True)
+            temp_path = f"{self.model_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'voices': self.voices}, f, indent=2)
+            os.replace(temp_path, self.model_path)
+        except Exception as e:
+            print(f"Error saving duration model: {e}")
+
+    def get_words_per_second(self, voice_id=None):
+        """Calibrated speaking rate for a voice, or the configured default"""
+        voice = self.voices.get(voice_id or Config.ELEVENLABS_VOICE_ID)
+        return voice['words_per_second'] if voice else Config.SPEECH_WORDS_PER_SECOND
+
+    def estimate(self, text, voice_id=None):
+        """Predicted speech duration of text in seconds"""
+        return count_words(text) / self.get_words_per_second(voice_id)
+
+    def estimate_background_duration(self, text, voice_id=None):
+        """Background length to render for text, rounded up to the start grid so segments are reusable"""
+        duration = self.estimate(text, voice_id) * Config.DURATION_ESTIMATE_MARGIN
+        grid = Config.BACKGROUND_START_GRID
+        duration = math.ceil(duration / grid) * grid
+        return max(grid, min(Config.MAX_DURATION, duration))
+
+    def record(self, text, actual_duration, voice_id=None):
+        """Fold a measured duration into the voice's speaking rate"""
+        words = count_words(text)
+        if words == 0 or not actual_duration:
+            return
+        voice_id = voice_id or Config.ELEVENLABS_VOICE_ID
+        rate = words / actual_duration
+        with self.lock:
+            voice = self.voices.get(voice_id)
+            if voice:
+                # Exponential moving average so the rate tracks recent runs
+                alpha = Config.DURATION_MODEL_ALPHA
+                voice['words_per_second'] = (1 - alpha) * voice['words_per_second'] + alpha * rate
+                voice['samples'] += 1
+            else:
+                self.voices[voice_id] = {'words_per_second': rate, 'samples': 1}
+            self.save_model()
+
+# Global instance so every video in a batch refines the same model
+duration_estimator = DurationEstimator()
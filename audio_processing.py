@@ -0,0 +1,328 @@
+import os
+import wave
+import threading
+import subprocess
+from collections import OrderedDict
+import numpy as np
+from config import Config
+from file_cache import FileCache
+from audio_cache import AudioCache
+from ffmpeg_utils import run_ffmpeg, get_ffmpeg_binary
+from voice_generator import load_voice_timing, get_pcm_sample_rate
+
+def read_wav(path):
+    """Mono int16 samples and sample rate of a 16-bit PCM WAV file"""
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path} is not 16-bit PCM")
+        channels = f.getnchannels()
+        sample_rate = f.getframerate()
+        data = f.readframes(f.getnframes())
+    samples = np.frombuffer(data, dtype='<i2')
+    samples = samples[:len(samples) - len(samples) % channels]
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, sample_rate
+
+def write_wav(path, samples, sample_rate):
+    """Write mono int16 samples as a PCM WAV file"""
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.astype('<i2').tobytes())
+
+def decode_audio(path, sample_rate=None):
+    """Decode any audio file to mono int16 samples"""
+    try:
+        return read_wav(path)
+    except (wave.Error, ValueError, EOFError):
+        pass
+    sample_rate = sample_rate or Config.AUDIO_DECODE_SAMPLE_RATE
+    result = run_ffmpeg([
+        "-i", path,
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ac", "1",
+        "-ar", sample_rate,
+        "-"
+    ])
+    return np.frombuffer(result.stdout, dtype='<i2'), sample_rate
+
+def find_silences(samples, sample_rate, threshold_db=None, window=None):
+    """(start, end) sample ranges whose windowed RMS stays below threshold_db dBFS"""
+    threshold_db = threshold_db if threshold_db is not None else Config.SILENCE_THRESHOLD_DB
+    window_size = max(1, int(sample_rate * (window or Config.SILENCE_WINDOW)))
+    window_count = len(samples) // window_size
+    if window_count == 0:
+        return []
+
+    frames = samples[:window_count * window_size].reshape(window_count, window_size).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    silent = rms < 32768.0 * 10 ** (threshold_db / 20)
+
+    # Run boundaries are where the padded mask changes value
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1) * window_size
+    ends = np.flatnonzero(edges == -1) * window_size
+    # The partial window at the end belongs to a trailing silence
+    if len(ends) and ends[-1] == window_count * window_size:
+        ends[-1] = len(samples)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def plan_silence_cuts(silences, total_samples, sample_rate, max_leading=None, max_trailing=None, max_gap=None):
+    """Sample ranges to remove so no silence is longer than its configured maximum"""
+    max_leading = int(sample_rate * (max_leading if max_leading is not None else Config.MAX_LEADING_SILENCE))
+    max_trailing = int(sample_rate * (max_trailing if max_trailing is not None else Config.MAX_TRAILING_SILENCE))
+    max_gap = int(sample_rate * (max_gap if max_gap is not None else Config.MAX_SILENCE_GAP))
+
+    cuts = []
+    for start, end in silences:
+        length = end - start
+        if start == 0 and end == total_samples:
+            continue
+        if start == 0:
+            if length > max_leading:
+                cuts.append((0, end - max_leading))
+        elif end == total_samples:
+            if length > max_trailing:
+                cuts.append((start + max_trailing, end))
+        elif length > max_gap:
+            # Keep half the allowed gap on each side so speech onsets are untouched
+            keep = max_gap // 2
+            cuts.append((start + keep, end - (max_gap - keep)))
+    return cuts
+
+def apply_cuts(samples, cuts):
+    """Samples with the cut ranges removed"""
+    if not cuts:
+        return samples
+    keep = np.ones(len(samples), dtype=bool)
+    for start, end in cuts:
+        keep[start:end] = False
+    return samples[keep]
+
+def remap_time(t, cuts, sample_rate):
+    """Position in the trimmed track of time t (seconds) in the original track"""
+    position = int(round(t * sample_rate))
+    removed = 0
+    for start, end in cuts:
+        if position <= start:
+            break
+        removed += min(position, end) - start
+    return (position - removed) / sample_rate
+
+class AudioProcessor:
+    """Decode voice tracks once and tighten their pacing by trimming silences"""
+
+    def __init__(self, max_decoded_in_memory=4):
+        self.pcm_cache = FileCache(
+            os.path.join(Config.CACHE_DIR, "pcm"),
+            Config.PCM_CACHE_MAX_BYTES,
+            extension=".npz"
+        )
+        self.trimmed_cache = AudioCache(os.path.join(Config.CACHE_DIR, "audio", "trimmed"), extension=".wav")
+        self.decoded = OrderedDict()
+        self.max_decoded_in_memory = max_decoded_in_memory
+        self.lock = threading.Lock()
+
+    def get_source_key(self, path):
+        """Cache key that changes whenever the file does"""
+        stat = os.stat(path)
+        return FileCache.make_key(os.path.abspath(path), stat.st_mtime, stat.st_size)
+
+    def load_pcm(self, path):
+        """Mono int16 samples and sample rate of path, decoded at most once"""
+        key = self.get_source_key(path)
+        with self.lock:
+            if key in self.decoded:
+                self.decoded.move_to_end(key)
+                return self.decoded[key]
+
+        cached_path = self.pcm_cache.get(key)
+        if cached_path:
+            with np.load(cached_path) as data:
+                decoded = (data['samples'], int(data['sample_rate']))
+        else:
+            decoded = decode_audio(path)
+            temp_path = self.pcm_cache.temp_path_for(key)
+            with open(temp_path, 'wb') as f:
+                np.savez(f, samples=decoded[0], sample_rate=decoded[1])
+            self.pcm_cache.commit(key, temp_path)
+
+        self.remember(key, decoded)
+        return decoded
+
+    def remember(self, key, decoded):
+        """Keep decoded samples in memory, dropping the least recently used"""
+        with self.lock:
+            self.decoded[key] = decoded
+            self.decoded.move_to_end(key)
+            if len(self.decoded) > self.max_decoded_in_memory:
+                self.decoded.popitem(last=False)
+
+    def add_decoded(self, path, decoded):
+        """Register samples decoded elsewhere, so load_pcm(path) does not decode it again"""
+        self.remember(self.get_source_key(path), decoded)
+
+    def create_stream_decoder(self, output_format):
+        """Listener for VoiceGenerator.generate_voice_stream that decodes the track as it downloads"""
+        return StreamDecoder(self, output_format)
+
+    def trim_silence(self, audio_path, output_path=None):
+        """Write a copy of audio_path with long silences shortened; returns its path
+
+        With output_path the trimmed track is linked there instead of being
+        returned from the cache, so a later eviction cannot remove it.
+        """
+        try:
+            cache_key = FileCache.make_key(
+                self.get_source_key(audio_path),
+                Config.SILENCE_THRESHOLD_DB,
+                Config.SILENCE_WINDOW,
+                Config.MAX_LEADING_SILENCE,
+                Config.MAX_TRAILING_SILENCE,
+                Config.MAX_SILENCE_GAP
+            )
+            cached_path = self.trimmed_cache.get(cache_key, export_to=output_path)
+            if cached_path:
+                return cached_path
+
+            samples, sample_rate = self.load_pcm(audio_path)
+            silences = find_silences(samples, sample_rate)
+            cuts = plan_silence_cuts(silences, len(samples), sample_rate)
+            trimmed = apply_cuts(samples, cuts)
+
+            temp_path = self.trimmed_cache.temp_path_for(cache_key)
+            write_wav(temp_path, trimmed, sample_rate)
+            # The sidecar goes in first so it is counted and exported along with the track
+            self.remap_timing(audio_path, cache_key, cuts, sample_rate)
+            output_path = self.trimmed_cache.commit(cache_key, temp_path, export_to=output_path)
+
+            removed = (len(samples) - len(trimmed)) / sample_rate
+            print(f"✂️  Trimmed {removed:.2f}s of silence "
+                  f"({len(samples) / sample_rate:.2f}s → {len(trimmed) / sample_rate:.2f}s)")
+            return output_path
+
+        except Exception as e:
+            print(f"⚠️  Could not trim silence, using the original voice track: {e}")
+            return audio_path
+
+    def remap_timing(self, audio_path, cache_key, cuts, sample_rate):
+        """Carry a sentence timing sidecar over to the trimmed track cached under cache_key"""
+        timing = load_voice_timing(audio_path)
+        if not timing:
+            return
+        for entry in timing:
+            entry['start'] = round(remap_time(entry['start'], cuts, sample_rate), 3)
+            entry['end'] = round(remap_time(entry['end'], cuts, sample_rate), 3)
+        self.trimmed_cache.write_timing(cache_key, timing)
+
+class StreamDecoder:
+    """Decode a voice stream while it downloads, so trimming finds the samples ready
+
+    Raw PCM formats are collected as they arrive; compressed ones are piped
+    through ffmpeg chunk by chunk instead of being decoded after the
+    download ends.
+    """
+
+    def __init__(self, processor, output_format):
+        self.processor = processor
+        self.pcm_sample_rate = get_pcm_sample_rate(output_format)
+        self.chunks = []
+        self.process = None
+        self.reader = None
+        self.output = b""
+        self.failed = False
+
+    def start_ffmpeg(self):
+        """Start an ffmpeg process decoding its stdin to mono 16-bit PCM"""
+        command = [
+            get_ffmpeg_binary(), "-loglevel", "error",
+            "-i", "pipe:0",
+            "-f", "s16le",
+            "-acodec", "pcm_s16le",
+            "-ac", "1",
+            "-ar", str(Config.AUDIO_DECODE_SAMPLE_RATE),
+            "pipe:1"
+        ]
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        # Drained on its own thread so a full stdout pipe never blocks the download
+        self.reader = threading.Thread(target=self.read_output, daemon=True)
+        self.reader.start()
+
+    def read_output(self):
+        """Collect everything ffmpeg decodes"""
+        self.output = self.process.stdout.read()
+
+    def feed(self, data):
+        """Decode the next chunk of the download"""
+        if self.failed:
+            return
+        if self.pcm_sample_rate:
+            self.chunks.append(data)
+            return
+        try:
+            if self.process is None:
+                self.start_ffmpeg()
+            self.process.stdin.write(data)
+        except Exception as e:
+            print(f"⚠️  Could not decode the voice track while it downloads: {e}")
+            self.failed = True
+            self.stop()
+
+    def stop(self):
+        """Abandon any decoding in progress"""
+        if self.process:
+            self.process.kill()
+            self.reader.join()
+            self.process.wait()
+            for pipe in (self.process.stdin, self.process.stdout):
+                try:
+                    pipe.close()
+                except OSError:
+                    pass
+        self.process = None
+        self.reader = None
+        self.output = b""
+
+    def restart(self):
+        """The download started over with another key, so start decoding over too"""
+        self.stop()
+        self.chunks = []
+        self.failed = False
+
+    def close(self, path, error):
+        """Hand the decoded samples of the finished track at path to the processor"""
+        if error or not path or self.failed:
+            self.stop()
+            return
+        try:
+            if self.pcm_sample_rate:
+                data = b"".join(self.chunks)
+                sample_rate = self.pcm_sample_rate
+            else:
+                if self.process is None:
+                    return
+                self.process.stdin.close()
+                self.reader.join()
+                if self.process.wait() != 0:
+                    raise RuntimeError(f"ffmpeg exited with code {self.process.returncode}")
+                self.process.stdout.close()
+                self.process = None
+                data = self.output
+                sample_rate = Config.AUDIO_DECODE_SAMPLE_RATE
+            if data:
+                samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2')
+                self.processor.add_decoded(path, (samples, sample_rate))
+        except Exception as e:
+            print(f"⚠️  Could not decode the voice track while it downloaded: {e}")
+            self.stop()
+        finally:
+            self.chunks = []
+            self.output = b""
+
+# Global instance so decoded tracks are shared by later stages
+audio_processor = AudioProcessor()
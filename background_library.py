@@ -0,0 +1,141 @@
+import os
+import random
+import bisect
+import threading
+from config import Config
+from file_lock import FileLock, read_json, write_json
+from ffmpeg_utils import probe_video, probe_keyframes
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.webm', '.avi', '.m4v')
+
+class BackgroundLibrary:
+    """Persistent index of background source videos and their keyframes
+
+    Pipeline worker processes each keep a library, so refreshes hold a file
+    lock on the index and start from what is on disk.
+    """
+
+    def __init__(self, library_dir=None, index_path=None):
+        self.library_dir = library_dir or Config.BACKGROUND_LIBRARY_DIR
+        self.index_path = index_path or os.path.join(Config.CACHE_DIR, "background_index.json")
+        self.entries = {}
+        self.lock = threading.RLock()
+        self.index_lock = FileLock(f"{self.index_path}.lock")
+        os.makedirs(self.library_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        """Load the persisted index"""
+        self.entries = read_json(self.index_path, {})
+
+    def merge_index(self):
+        """Take entries other processes indexed since we loaded (caller holds the index lock)"""
+        self.entries.update(read_json(self.index_path, {}))
+
+    def save_index(self):
+        """Atomically write the index (caller holds the index lock)"""
+        try:
+            write_json(self.index_path, self.entries)
+        except Exception as e:
+            print(f"Error saving background index: {e}")
+
+    def find_source_files(self):
+        """All background source videos in the library plus configured paths"""
+        sources = []
+        for root, dirs, files in os.walk(self.library_dir):
+            # Skip generated output such as cached or pooled segments
+            dirs[:] = [d for d in dirs if not d.startswith(('.', 'pool', 'cache'))]
+            for filename in files:
+                if filename.startswith('processed_background_'):
+                    continue
+                if filename.lower().endswith(VIDEO_EXTENSIONS):
+                    sources.append(os.path.abspath(os.path.join(root, filename)))
+
+        for path in Config.BACKGROUND_VIDEOS:
+            if path and os.path.exists(path):
+                sources.append(os.path.abspath(path))
+
+        return sorted(set(sources))
+
+    def refresh(self):
+        """Probe new or changed sources and drop missing ones"""
+        # Held while probing so a second process waits and then reuses the results
+        with self.lock, self.index_lock:
+            self.merge_index()
+            changed = False
+            sources = self.find_source_files()
+
+            for path in sources:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                entry = self.entries.get(path)
+                if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                    continue
+
+                try:
+                    print(f"Indexing background: {os.path.basename(path)}...")
+                    info = probe_video(path)
+                    info['keyframes'] = probe_keyframes(path)
+                    info['mtime'] = stat.st_mtime
+                    info['size'] = stat.st_size
+                    self.entries[path] = info
+                    changed = True
+                except Exception as e:
+                    print(f"Error indexing {path}: {e}")
+
+            for path in list(self.entries):
+                if path not in sources:
+                    del self.entries[path]
+                    changed = True
+
+            if changed:
+                self.save_index()
+            return len(self.entries)
+
+    def get_entries(self, min_duration=0):
+        """Indexed sources that are at least min_duration seconds long"""
+        with self.lock:
+            return [
+                dict(entry, path=path)
+                for path, entry in self.entries.items()
+                if entry.get('duration', 0) >= min_duration
+            ]
+
+    def snap_to_keyframe(self, entry, start_time):
+        """Move start_time back to the nearest keyframe so seeking does not decode"""
+        keyframes = entry.get('keyframes') or []
+        index = bisect.bisect_right(keyframes, start_time) - 1
+        if index >= 0:
+            return keyframes[index]
+        return 0
+
+    def pick_segment(self, target_duration):
+        """Choose a random source segment from the index without opening any media"""
+        entries = self.get_entries(min_duration=target_duration) or self.get_entries()
+        entries = [entry for entry in entries if entry.get('duration', 0) > 0]
+        if not entries:
+            return None
+
+        entry = random.choice(entries)
+        duration = min(target_duration, entry['duration'])
+        max_start_time = max(0, entry['duration'] - duration)
+
+        # Grid-aligned starts keep segments reusable by the segment cache
+        grid = Config.BACKGROUND_START_GRID
+        if grid > 0:
+            start_time = random.randrange(int(max_start_time // grid) + 1) * grid
+        else:
+            start_time = random.uniform(0, max_start_time)
+
+        return {
+            'source': entry['path'],
+            'start_time': self.snap_to_keyframe(entry, start_time),
+            'duration': duration,
+            'width': entry.get('width'),
+            'height': entry.get('height'),
+            'fps': entry.get('fps')
+        }
@@ -0,0 +1,186 @@
+import os
+import glob
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+_worker_manager = None
+
+def render_pool_segment(segment_plan, output_path):
+    """Render one pooled segment inside a worker process"""
+    global _worker_manager
+    if _worker_manager is None:
+        from background_video import BackgroundVideoManager
+        _worker_manager = BackgroundVideoManager()
+
+    return _worker_manager.process_video_for_shorts(
+        segment_plan['source'],
+        output_path,
+        segment_plan['duration'],
+        start_time=segment_plan['start_time'],
+        fallback=False
+    )
+
+class BackgroundPool:
+    """Keep ready-to-use 9:16 background segments rendered ahead of demand"""
+
+    def __init__(self, library, pool_dir=None, durations=None, segments_per_duration=None,
+                 workers=None, max_bytes=None, max_load=None):
+        self.library = library
+        self.pool_dir = pool_dir or os.path.join(Config.BACKGROUND_LIBRARY_DIR, "pool")
+        self.durations = sorted(durations or Config.BACKGROUND_POOL_DURATIONS)
+        self.segments_per_duration = segments_per_duration or Config.BACKGROUND_POOL_SIZE
+        self.workers = workers or Config.BACKGROUND_POOL_WORKERS
+        self.max_bytes = max_bytes if max_bytes is not None else Config.BACKGROUND_POOL_MAX_BYTES
+        self.max_load = max_load if max_load is not None else Config.BACKGROUND_POOL_MAX_LOAD
+
+        self.ready = {duration: deque() for duration in self.durations}
+        self.pending = {duration: 0 for duration in self.durations}
+        self.sizes = {}
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.executor = None
+        self.thread = None
+
+        os.makedirs(self.pool_dir, exist_ok=True)
+        self.load_existing()
+
+    def load_existing(self):
+        """Pick up segments rendered by a previous run"""
+        for path in glob.glob(os.path.join(self.pool_dir, "*.tmp.mp4")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        for duration in self.durations:
+            files = glob.glob(os.path.join(self.pool_dir, f"pool_{duration}s_*.mp4"))
+            files.sort(key=os.path.getmtime)
+            for path in files:
+                self.ready[duration].append(path)
+                self.sizes[path] = os.path.getsize(path)
+
+    def start(self):
+        """Start the producer thread and its worker processes"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.thread = threading.Thread(target=self.run, name="background-pool", daemon=True)
+        self.thread.start()
+        print(f"🎞️  Background pool started ({self.workers} workers, durations {self.durations})")
+
+    def stop(self):
+        """Stop producing; segments already rendered stay on disk for next time"""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def get_pool_bytes(self):
+        """Disk space used by ready segments"""
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def cpu_load_ok(self):
+        """Whether the machine has spare CPU for another render"""
+        if not hasattr(os, 'getloadavg'):
+            return True
+        load_per_core = os.getloadavg()[0] / (os.cpu_count() or 1)
+        return load_per_core < self.max_load
+
+    def next_duration_to_fill(self):
+        """Duration with the largest shortfall, or None if the pool is full"""
+        with self.lock:
+            best_duration, best_deficit = None, 0
+            for duration in self.durations:
+                deficit = self.segments_per_duration - len(self.ready[duration]) - self.pending[duration]
+                if deficit > best_deficit:
+                    best_duration, best_deficit = duration, deficit
+            return best_duration
+
+    def run(self):
+        """Producer loop: render segments while there is demand and headroom"""
+        while not self.stop_event.is_set():
+            with self.lock:
+                in_flight = sum(self.pending.values())
+
+            duration = self.next_duration_to_fill()
+            can_submit = (
+                duration is not None
+                and in_flight < self.workers
+                and self.get_pool_bytes() < self.max_bytes
+                and self.cpu_load_ok()
+            )
+
+            if not can_submit or not self.submit(duration):
+                self.wake_event.wait(timeout=Config.BACKGROUND_POOL_POLL_INTERVAL)
+                self.wake_event.clear()
+
+    def submit(self, duration):
+        """Queue one render of the given duration"""
+        segment_plan = self.library.pick_segment(duration)
+        if not segment_plan or segment_plan['duration'] < duration:
+            return False
+
+        name = f"pool_{duration}s_{uuid.uuid4().hex[:12]}"
+        temp_path = os.path.join(self.pool_dir, f"{name}.tmp.mp4")
+        final_path = os.path.join(self.pool_dir, f"{name}.mp4")
+
+        with self.lock:
+            self.pending[duration] += 1
+
+        future = self.executor.submit(render_pool_segment, segment_plan, temp_path)
+        future.add_done_callback(
+            lambda f: self.on_rendered(f, duration, temp_path, final_path)
+        )
+        return True
+
+    def on_rendered(self, future, duration, temp_path, final_path):
+        """Move a finished render into the ready queue"""
+        try:
+            result = None if future.cancelled() else future.result()
+        except Exception as e:
+            print(f"Error rendering pooled background: {e}")
+            result = None
+
+        with self.lock:
+            self.pending[duration] -= 1
+            if result and os.path.exists(temp_path):
+                os.replace(temp_path, final_path)
+                self.ready[duration].append(final_path)
+                self.sizes[final_path] = os.path.getsize(final_path)
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.wake_event.set()
+
+    def pop(self, target_duration):
+        """Take a ready segment at least target_duration long, or None"""
+        with self.lock:
+            for duration in self.durations:
+                if duration >= target_duration and self.ready[duration]:
+                    path = self.ready[duration].popleft()
+                    self.sizes.pop(path, None)
+                    break
+            else:
+                return None
+
+        # Let the producer replace what was just taken
+        self.wake_event.set()
+        return path
+
+    def get_stats(self):
+        """Ready and in-flight segment counts per duration"""
+        with self.lock:
+            return {
+                duration: {'ready': len(self.ready[duration]), 'pending': self.pending[duration]}
+                for duration in self.durations
+            }
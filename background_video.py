@@ -2,13 +2,42 @@ import os
 import random
 import datetime
 from config import Config
+from segment_cache import SegmentCache
+from background_library import BackgroundLibrary
+
+def fit_clip_to_shorts(clip, target_w=None, target_h=None):
+    """Center-crop a clip to 9:16 and resize it to the Shorts resolution"""
+    target_w = target_w or Config.VIDEO_WIDTH
+    target_h = target_h or Config.VIDEO_HEIGHT
+    w, h = clip.size
+    
+    # Calculate crop dimensions to maintain aspect ratio
+    if w / h > target_w / target_h:
+        # Video is wider than 9:16, crop width
+        new_w = int(h * target_w / target_h)
+        x1 = (w - new_w) // 2
+        clip = clip.crop(x1=x1, y1=0, x2=x1+new_w, y2=h)
+    elif w / h < target_w / target_h:
+        # Video is taller than 9:16, crop height
+        new_h = int(w * target_h / target_w)
+        y1 = (h - new_h) // 2
+        clip = clip.crop(x1=0, y1=y1, x2=w, y2=y1+new_h)
+    
+    # Resize to exact dimensions
+    if tuple(clip.size) != (target_w, target_h):
+        clip = clip.resize((target_w, target_h))
+    return clip
 
 class BackgroundVideoManager:
     def __init__(self):
-        self.background_dir = "assets/backgrounds"
-        # User should specify their own background video path
-        self.local_background = Config.BACKGROUND_VIDEOS[0] if Config.BACKGROUND_VIDEOS else None
+        self.background_dir = Config.BACKGROUND_LIBRARY_DIR
+        self.animated_generator = None
         self.ensure_directories()
+        self.segment_cache = SegmentCache()
+        # Indexes assets/backgrounds plus Config.BACKGROUND_VIDEOS, probing only new or changed files
+        self.library = BackgroundLibrary(self.background_dir)
+        self.library.refresh()
+        self.pool = None
         
     def ensure_directories(self):
         """Ensure necessary directories exist"""
@@ -17,82 +46,135 @@ class BackgroundVideoManager:
         os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
     
     def get_random_background(self, target_duration=None, video_id=None):
-        """Get background video - create unique processed video for each request"""
+        """Get background video - reuse a cached segment or process a new one"""
+        if target_duration is None:
+            target_duration = Config.MAX_DURATION
+        
+        pooled_path = self.take_pooled_background(target_duration, video_id)
+        if pooled_path:
+            return pooled_path
+        
+        segment_plan = self.library.pick_segment(target_duration)
+        if segment_plan:
+            # Linked out of the cache so another process's eviction cannot remove it before the render
+            cached_path = self.get_cached_segment(segment_plan, export_to=self.get_background_output_path(video_id))
+            if cached_path:
+                return cached_path
+        
+        print("Background segment not available, creating animated background...")
+        return self.create_animated_background(self.get_background_output_path(video_id), target_duration)
+    
+    def get_background_output_path(self, video_id=None):
+        """Unique path for a processed background"""
         # Generate unique filename with timestamp and video ID
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # Include milliseconds
         if video_id:
             filename = f"processed_background_{video_id}_{timestamp}.mp4"
         else:
             filename = f"processed_background_{timestamp}.mp4"
+        return os.path.join(self.background_dir, filename)
+    
+    def remove_processed_background(self, path):
+        """Delete a single-use processed background once its video is rendered"""
+        if not path or not os.path.basename(path).startswith("processed_background_"):
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def take_pooled_background(self, target_duration, video_id=None):
+        """Claim a pre-rendered segment as a processed background, or None if none is ready"""
+        if not self.pool:
+            return None
+        pooled_path = self.pool.pop(target_duration)
+        if not pooled_path:
+            return None
+        # Pooled segments are single-use, so hand them over as a processed background
+        output_path = self.get_background_output_path(video_id)
+        os.replace(pooled_path, output_path)
+        print(f"Using pre-rendered background: {os.path.basename(output_path)}")
+        return output_path
+    
+    def start_pool(self):
+        """Start pre-rendering background segments in worker processes"""
+        from background_pool import BackgroundPool
         
-        output_path = os.path.join(self.background_dir, filename)
-        
-        # Always create a new processed background
-        if self.local_background and os.path.exists(self.local_background):
-            print(f"Processing local video for YouTube Shorts (unique: {filename})...")
-            self.process_video_for_shorts(self.local_background, output_path, target_duration)
-        else:
-            print("Local video not found, creating animated background...")
-            self.create_animated_background(output_path)
+        if self.pool is None:
+            self.pool = BackgroundPool(self.library)
+        self.pool.start()
+        return self.pool
+    
+    def stop_pool(self):
+        """Stop the pre-render pool, keeping segments it already rendered"""
+        if self.pool:
+            self.pool.stop()
+    
+    def plan_background_segment(self, target_duration=None):
+        """Choose a source segment without rendering it, for single-pass renders"""
+        if target_duration is None:
+            target_duration = Config.MAX_DURATION
         
-        return output_path
+        try:
+            return self.library.pick_segment(target_duration)
+        except Exception as e:
+            print(f"Error planning background segment: {e}")
+            return None
     
-    def create_animated_background(self, output_path):
-        """Create an animated background video"""
+    def get_cached_segment(self, segment_plan, export_to=None):
+        """Return the processed segment for a plan (linked to export_to if given), rendering it on a cache miss"""
         try:
-            from moviepy.editor import ColorClip, CompositeVideoClip
-            import numpy as np
+            input_path = segment_plan['source']
+            start_time = segment_plan['start_time']
+            duration = segment_plan['duration']
+            key = self.segment_cache.make_segment_key(input_path, start_time, duration)
             
-            # Create a base color clip with random colors for uniqueness
-            base_clip = ColorClip(
-                size=(Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT),
-                color=(random.randint(50, 150), random.randint(50, 150), random.randint(50, 150)),
-                duration=Config.MAX_DURATION
-            )
+            cached_path = self.segment_cache.get(key, export_to=export_to)
+            if cached_path:
+                print(f"Reusing cached background segment from {start_time:.1f}s ({duration:.1f}s)")
+                self.segment_cache.print_stats()
+                return cached_path
             
-            # Add some animated elements (simple moving shapes)
-            def make_frame(t):
-                # Create a frame with moving gradient
-                frame = np.zeros((Config.VIDEO_HEIGHT, Config.VIDEO_WIDTH, 3), dtype=np.uint8)
-                
-                # Create moving gradient effect with random seed for uniqueness
-                seed = hash(output_path) % 1000  # Use output path as seed for consistency
-                random.seed(seed)
-                
-                for y in range(Config.VIDEO_HEIGHT):
-                    for x in range(Config.VIDEO_WIDTH):
-                        # Moving gradient based on time with unique pattern
-                        intensity = int(128 + 64 * np.sin(t * 0.5 + x * 0.01 + y * 0.01 + seed * 0.1))
-                        frame[y, x] = [intensity, intensity//2, intensity//3]
-                
-                return frame
+            print(f"Processing local video for YouTube Shorts (segment at {start_time:.1f}s)...")
+            temp_path = self.segment_cache.temp_path_for(key)
+            result = self.process_video_for_shorts(
+                input_path,
+                temp_path,
+                duration,
+                start_time=start_time,
+                fallback=False
+            )
+            if not result:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return None
             
-            animated_clip = ColorClip(
-                size=(Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT),
-                color=(0, 0, 0),
-                duration=Config.MAX_DURATION
-            ).set_make_frame(make_frame)
+            cached_path = self.segment_cache.commit(key, temp_path, export_to=export_to)
+            self.segment_cache.print_stats()
+            return cached_path
             
-            # Combine clips
-            final_clip = CompositeVideoClip([base_clip, animated_clip])
+        except Exception as e:
+            print(f"Error getting cached background segment: {e}")
+            return None
+    
+    def create_animated_background(self, output_path, duration=None):
+        """Create an animated background video"""
+        try:
+            from animated_background import AnimatedBackgroundGenerator
             
-            final_clip.write_videofile(
-                output_path,
-                fps=Config.VIDEO_FPS,
-                codec='libx264',
-                verbose=False,
-                logger=None
-            )
+            if self.animated_generator is None:
+                self.animated_generator = AnimatedBackgroundGenerator()
             
-            final_clip.close()
+            self.animated_generator.render(output_path, duration=duration)
             print(f"Animated background created: {output_path}")
+            return output_path
             
         except Exception as e:
             print(f"Error creating animated background: {e}")
             # Fallback to simple color clip
-            self.create_simple_background(output_path)
+            return self.create_simple_background(output_path, duration)
 
-    def create_simple_background(self, output_path):
+    def create_simple_background(self, output_path, duration=None):
         """Create a simple colored background"""
         try:
             from moviepy.editor import ColorClip
@@ -100,16 +182,18 @@ class BackgroundVideoManager:
             clip = ColorClip(
                 size=(Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT),
                 color=(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)),
-                duration=Config.MAX_DURATION
+                duration=duration or Config.MAX_DURATION
             )
             
             clip.write_videofile(output_path, fps=Config.VIDEO_FPS, verbose=False, logger=None)
             print(f"Simple background created: {output_path}")
+            return output_path
             
         except Exception as e:
             print(f"Error creating simple background: {e}")
+            return None
 
-    def process_video_for_shorts(self, input_path, output_path, target_duration=None):
+    def process_video_for_shorts(self, input_path, output_path, target_duration=None, start_time=None, fallback=True):
         """Process video to extract random segment and convert to 9:16 for YouTube Shorts"""
         try:
             from moviepy.editor import VideoFileClip
@@ -127,7 +211,9 @@ class BackgroundVideoManager:
             max_start_time = max(0, total_duration - target_duration)
             
             # Extract random segment with more randomness for uniqueness
-            if max_start_time > 0:
+            if start_time is not None:
+                start_time = min(start_time, max_start_time)
+            elif max_start_time > 0:
                 # Use output path as seed for consistent but unique randomness
                 random.seed(hash(output_path) % 10000)
                 start_time = random.uniform(0, max_start_time)
@@ -138,23 +224,7 @@ class BackgroundVideoManager:
             segment = video.subclip(start_time, end_time)
             
             # Convert to 9:16 aspect ratio for YouTube Shorts
-            w, h = segment.size
-            target_w, target_h = Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT
-            
-            # Calculate crop dimensions to maintain aspect ratio
-            if w / h > target_w / target_h:
-                # Video is wider than 9:16, crop width
-                new_w = int(h * target_w / target_h)
-                x1 = (w - new_w) // 2
-                segment = segment.crop(x1=x1, y1=0, x2=x1+new_w, y2=h)
-            elif w / h < target_w / target_h:
-                # Video is taller than 9:16, crop height
-                new_h = int(w * target_h / target_w)
-                y1 = (h - new_h) // 2
-                segment = segment.crop(x1=0, y1=y1, x2=w, y2=y1+new_h)
-            
-            # Resize to exact dimensions
-            segment = segment.resize((target_w, target_h))
+            segment = fit_clip_to_shorts(segment)
             
             # Write processed video
             print(f"Processing video segment from {start_time:.1f}s to {end_time:.1f}s...")
@@ -174,7 +244,9 @@ class BackgroundVideoManager:
             
         except Exception as e:
             print(f"Error processing background video: {e}")
-            return self.create_animated_background(output_path)
+            if not fallback:
+                return None
+            return self.create_animated_background(output_path, target_duration)
     
     def download_sample_backgrounds(self):
         """No-op: Always use local video."""
@@ -182,6 +254,9 @@ class BackgroundVideoManager:
     
     def cleanup_old_videos(self, max_files=10):
         """Clean up old background videos to save space"""
+        # Cached segments are bounded by the cache's byte budget instead of file count
+        self.segment_cache.evict()
+        
         try:
             import glob
             background_files = glob.glob(os.path.join(self.background_dir, "processed_background_*.mp4"))
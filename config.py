@@ -7,10 +7,79 @@ class Config:
     # Cohere Configuration
     COHERE_API_KEY = os.getenv('COHERE_API_KEY', '')
     COHERE_MODEL = "command"  # Cohere's Command model for text generation
+    COHERE_REQUESTS_PER_MINUTE = 10  # per API key - trial keys allow far fewer calls than production keys
+    COHERE_MAX_IN_FLIGHT = 4  # concurrent requests per Cohere key
+    STORY_CONCURRENCY = 8  # story generations in flight at once
+    STORY_MAX_ATTEMPTS = 3  # per story, rotating keys between attempts
+    STORY_POOL_ENABLED = True  # Keep pre-generated stories per genre in cache/story_pool.json
+    STORY_POOL_LOW_WATERMARK = 2  # refill a genre when fewer stories than this are ready
+    STORY_POOL_HIGH_WATERMARK = 6  # and top it up to this many
+    STORY_POOL_GENERATIONS = 3  # stories per Cohere request (at most 5)
+    STORY_TARGET_DURATION = 55  # seconds of speech to aim for, leaving room under MAX_DURATION
+    STORY_TOKENS_PER_WORD = 1.4  # Cohere tokens per generated English word
+    STORY_TOKEN_HEADROOM = 1.25  # extra tokens so stories can finish; overshoot is trimmed at sentence ends
+    STORY_MIN_TOKENS = 200
+    STORY_MAX_TOKENS = 800
+    DURATION_HISTORY_SIZE = 200  # predicted vs actual speech lengths kept in cache/duration_fit.json
+    STORY_DEDUP_ENABLED = True  # Regenerate stories too similar to one already saved
+    STORY_DUPLICATE_THRESHOLD = 0.5  # estimated Jaccard similarity of word shingles
+    STORY_DEDUP_ATTEMPTS = 3  # generations per story before giving up on a distinct one
+    STORY_SHINGLE_SIZE = 3  # words per shingle
+    STORY_MINHASH_PERMUTATIONS = 128  # signature length (at most 256)
+    STORY_LSH_BANDS = 32  # 32 bands of 4 rows catch pairs from roughly 0.4 similarity up
+    SERIES_SENTENCES_PER_PART = 3  # key sentences kept from each part of a continued story
+    SERIES_SUMMARY_MAX_WORDS = 180  # cap on the rolling series summary in continuation prompts
+    SERIES_TAIL_WORDS = 80  # words quoted from the end of the previous part
     
     # ElevenLabs Configuration
     ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY', '')
     ELEVENLABS_VOICE_ID = os.getenv('ELEVENLABS_VOICE_ID', '21m00Tcm4TlvDq8ikWAM')  # Default male voice
+    ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
+    ELEVENLABS_VOICE_SETTINGS = {
+        "stability": 0.5,
+        "similarity_boost": 0.5
+    }
+    ELEVENLABS_REQUESTS_PER_MINUTE = 60  # per API key
+    ELEVENLABS_MAX_IN_FLIGHT = 2  # concurrent requests per key (the free tier allows 2)
+    AUDIO_CACHE_MAX_BYTES = 500 * 1024 * 1024  # 500 MB of synthesized voice audio
+    VOICE_STREAMING = True  # Write TTS audio to disk as it arrives and overlap it with the background stage
+    VOICE_STREAM_FORMAT = "mp3_44100_128"  # Or a raw PCM format such as "pcm_22050" (saved as .wav)
+    VOICE_STREAM_CHUNK_SIZE = 16 * 1024  # bytes
+    VOICE_CHUNKED = False  # Synthesize sentences concurrently and join them (takes precedence over streaming)
+    VOICE_CHUNK_FORMAT = "pcm_24000"  # Raw PCM so chunks join without gaps or codec padding
+    VOICE_CHUNK_WORKERS = 3  # Concurrent synthesis requests per story
+    VOICE_SENTENCE_GAP = 0.15  # seconds of silence between sentences
+    SPEECH_WORDS_PER_SECOND = 2.5  # Starting guess for speech length until past runs calibrate it
+    DURATION_ESTIMATE_MARGIN = 1.1  # Render backgrounds this much longer than the predicted speech
+    DURATION_MODEL_ALPHA = 0.3  # Weight of the newest run when calibrating the speaking rate
+    
+    # Voice Post-processing
+    TRIM_SILENCE = True  # Shorten leading, trailing and over-long pauses in the voice track
+    SILENCE_THRESHOLD_DB = -40  # dBFS - windows quieter than this count as silence
+    SILENCE_WINDOW = 0.02  # seconds per RMS window
+    MAX_LEADING_SILENCE = 0.1  # seconds
+    MAX_TRAILING_SILENCE = 0.3  # seconds
+    MAX_SILENCE_GAP = 0.35  # seconds - longest pause kept between words or sentences
+    AUDIO_DECODE_SAMPLE_RATE = 44100  # Rate compressed voice tracks are decoded at
+    PCM_CACHE_MAX_BYTES = 500 * 1024 * 1024  # 500 MB of decoded voice tracks
+    
+    # HTTP Client Configuration
+    HTTP_POOL_SIZE = 10  # Keep-alive connections per host
+    HTTP_CONNECT_TIMEOUT = 5  # seconds
+    HTTP_READ_TIMEOUT = 60  # seconds between bytes, not for the whole response
+    HTTP_MAX_RETRIES = 3  # Retries per API key for 429, 5xx, timeouts and connection errors
+    HTTP_BACKOFF_BASE = 1  # seconds - doubled on every retry, with full jitter
+    HTTP_BACKOFF_MAX = 30  # seconds
+    HTTP_RETRY_AFTER_MAX = 60  # seconds - longest Retry-After we are willing to wait
+    KEY_RATE_LIMIT_COOLDOWN = 30  # seconds a key rests after a 429 without Retry-After
+    KEY_INVALID_COOLDOWN = 3600  # seconds a key rests after a 401/403
+    KEY_LEASE_TIMEOUT = 300  # seconds before a lease left by a crashed process expires
+    KEY_LEASE_WAIT = 120  # longest wait for a free key before giving up
+    KEY_POLL_INTERVAL = 0.2  # seconds between checks while every key is busy
+    QUOTA_RESET_DAY = 1  # day of the month API quotas reset
+    ELEVENLABS_CHARACTER_QUOTA = None  # characters per key per billing period, e.g. 10000 on the free tier; None for no limit
+    COHERE_TOKEN_QUOTA = None  # tokens per key per billing period; None for no limit
+    # Per-key overrides go in api_keys.json as "key_quotas": {"<fingerprint>": limit}
     
     # Video Configuration - Optimized for YouTube Shorts
     VIDEO_WIDTH = 1080
@@ -21,6 +90,46 @@ class Config:
     # Output Configuration
     OUTPUT_DIR = "output"
     TEMP_DIR = "temp"
+    CACHE_DIR = "cache"
+    SCRIPT_DB_PATH = "cache/scripts.db"  # SQLite index of scripts/*.json, built on first run
+    SCRIPTS_PAGE_SIZE = 20  # scripts per page when choosing a story to continue
+    
+    # Background Segment Cache
+    BACKGROUND_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB of processed segments
+    BACKGROUND_START_GRID = 5  # seconds - segment start offsets snap to this grid so they can be reused
+    BACKGROUND_LIBRARY_DIR = "assets/backgrounds"  # Every video in here is indexed as a background source
+    FFPROBE_BINARY = "ffprobe"  # Optional - keyframes are read from packet flags when available
+    SINGLE_PASS_RENDER = True  # Render straight from the source video instead of encoding an intermediate background
+    
+    # Background Pre-render Pool (used for batches when SINGLE_PASS_RENDER is off)
+    # Single-pass renders decode the source directly, so there is nothing to pre-render:
+    # this only takes effect with SINGLE_PASS_RENDER = False
+    BACKGROUND_POOL_ENABLED = True
+    BACKGROUND_POOL_DURATIONS = [30, 45, 60]  # seconds - segment lengths kept ready
+    BACKGROUND_POOL_SIZE = 2  # ready segments per duration
+    BACKGROUND_POOL_WORKERS = 2  # render processes
+    BACKGROUND_POOL_MAX_BYTES = 1024 * 1024 * 1024  # stop rendering past 1 GB of ready segments
+    BACKGROUND_POOL_MAX_LOAD = 0.9  # stop rendering when 1-minute load per core exceeds this
+    BACKGROUND_POOL_POLL_INTERVAL = 2  # seconds between producer checks when idle
+    
+    # Batch Pipeline (stories, voices, backgrounds and renders of different videos overlap)
+    PIPELINE_VOICE_WORKERS = 2  # voice tracks synthesized at once (threads)
+    PIPELINE_BACKGROUND_WORKERS = 2  # backgrounds rendered at once (processes)
+    PIPELINE_RENDER_WORKERS = 2  # final videos encoded at once (processes)
+    PIPELINE_QUEUE_SIZE = 2  # videos waiting per stage before the stage feeding it blocks
+    
+    # Subtitle Configuration
+    SUBTITLE_FONT = ""  # Path or file name of a .ttf font; empty picks Arial Bold / DejaVu Sans Bold
+    SUBTITLE_RENDERER = "ffmpeg"  # "ffmpeg" burns ASS subtitles with libass, "python" composites frames in MoviePy
+    KEEP_SUBTITLE_SIDECARS = True  # Keep .srt/.ass files next to each video for platforms that accept captions
+    SUBTITLE_ALIGN_TO_AUDIO = True  # Time captions from pauses in the voice track instead of splitting evenly
+    SUBTITLE_MIN_PAUSE = 0.08  # seconds - shorter silences are treated as part of the speech
+    SUBTITLE_SNAP_TOLERANCE = 1.0  # seconds of speech a punctuation mark may move to reach a pause
+    SUBTITLE_MAX_WORDS = 10  # Upper bound on words per caption; line width usually decides first
+    SUBTITLE_MAX_LINES = 2  # lines per caption
+    SUBTITLE_READING_SPEED = 17  # characters per second a viewer can comfortably read
+    SUBTITLE_MIN_DURATION = 0.8  # seconds - shortest time a caption stays on screen
+    SUBTITLE_HOLD = 0.4  # seconds a caption stays up after its last word
     
     # User Preferences
     PREFERRED_VOICE_TYPE = "male"
@@ -0,0 +1,135 @@
+import os
+import json
+import math
+import time
+import threading
+from config import Config
+from audio_probe import count_words, duration_estimator
+from text_utils import split_sentences
+
+def estimate_tokens(text):
+    """Rough Cohere token count of text"""
+    return math.ceil(count_words(text) * Config.STORY_TOKENS_PER_WORD)
+
+class DurationFitter:
+    """Size story generation and text to the target video length
+
+    Token budgets and trimming both come from the calibrated speaking rate
+    in duration_estimator, and every measured voice track is fed back into
+    it, so predictions improve with each video.
+    """
+
+    def __init__(self, estimator=None, history_path=None):
+        self.estimator = estimator or duration_estimator
+        self.history_path = history_path or os.path.join(Config.CACHE_DIR, "duration_fit.json")
+        self.history = []
+        self.lock = threading.Lock()
+        self.load_history()
+
+    def load_history(self):
+        """Load predicted and actual durations of past runs"""
+        if not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                self.history = json.load(f).get('runs', [])
+        except Exception as e:
+            print(f"Error loading duration history: {e}")
+            self.history = []
+
+    def save_history(self):
+        """Atomically save the most recent runs (caller holds the lock)"""
+        try:
+            os.makedirs(os.path.dirname(self.history_path) or ".", exist_ok=True)
+            temp_path = f"{self.history_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'runs': self.history[-Config.DURATION_HISTORY_SIZE:]}, f, indent=2)
+            os.replace(temp_path, self.history_path)
+        except Exception as e:
+            print(f"Error saving duration history: {e}")
+
+    def get_target_duration(self):
+        """Seconds of speech to aim for, leaving room under the Shorts limit"""
+        return min(Config.STORY_TARGET_DURATION, Config.MAX_DURATION)
+
+    def get_max_tokens(self, target_duration=None):
+        """Cohere token budget for a story that fills target_duration when spoken"""
+        target_duration = target_duration or self.get_target_duration()
+        words = target_duration * self.estimator.get_words_per_second()
+        # Headroom lets the model finish its ending; fit_text trims any overshoot
+        tokens = math.ceil(words * Config.STORY_TOKENS_PER_WORD * Config.STORY_TOKEN_HEADROOM)
+        return max(Config.STORY_MIN_TOKENS, min(Config.STORY_MAX_TOKENS, tokens))
+
+    def fit_text(self, text, target_duration=None):
+        """Longest run of whole opening sentences of text predicted to fit target_duration"""
+        target_duration = target_duration or self.get_target_duration()
+        if self.estimator.estimate(text) <= target_duration:
+            return text
+
+        sentences = split_sentences(text)
+        words_per_second = self.estimator.get_words_per_second()
+        kept = []
+        words = 0
+        for sentence in sentences:
+            sentence_words = count_words(sentence)
+            if kept and (words + sentence_words) / words_per_second > target_duration:
+                break
+            kept.append(sentence)
+            words += sentence_words
+
+        fitted = ' '.join(kept)
+        print(f"✂️  Trimmed story from {len(sentences)} to {len(kept)} sentences "
+              f"(~{self.estimator.estimate(fitted):.0f}s of {target_duration:.0f}s)")
+        return fitted
+
+    def predict(self, text):
+        """Speech length of text predicted before synthesis, for record to compare against"""
+        return round(self.estimator.estimate(text), 3)
+
+    def record(self, text, actual_duration, video_id=None, predicted=None):
+        """Log predicted against actual speech length and calibrate the estimator
+
+        predicted should be the estimate made before synthesis; recomputing it
+        here would use a speaking rate that other videos may have calibrated since.
+        """
+        if not actual_duration:
+            return
+        if predicted is None:
+            predicted = self.estimator.estimate(text)
+        error = (actual_duration - predicted) / actual_duration
+        print(f"📏 Speech length: predicted {predicted:.1f}s, actual {actual_duration:.1f}s ({error:+.0%})")
+
+        with self.lock:
+            self.history.append({
+                'video_id': video_id,
+                'words': count_words(text),
+                'predicted': round(predicted, 3),
+                'actual': round(actual_duration, 3),
+                'time': time.time()
+            })
+            self.history = self.history[-Config.DURATION_HISTORY_SIZE:]
+            self.save_history()
+        self.estimator.record(text, actual_duration)
+
+    def clamp_render_duration(self, duration):
+        """duration limited to Config.MAX_DURATION, with a warning when it had to be cut"""
+        if duration > Config.MAX_DURATION:
+            print(f"⚠️  Voice track is {duration:.1f}s; cutting the video at {Config.MAX_DURATION}s")
+            return float(Config.MAX_DURATION)
+        return duration
+
+    def get_stats(self):
+        """Mean absolute prediction error over the recorded runs"""
+        with self.lock:
+            runs = list(self.history)
+        if not runs:
+            return {'runs': 0, 'mean_abs_error': None}
+        errors = [abs(run['actual'] - run['predicted']) / run['actual'] for run in runs if run['actual']]
+        return {
+            'runs': len(runs),
+            'mean_abs_error': sum(errors) / len(errors) if errors else None,
+            'words_per_second': self.estimator.get_words_per_second()
+        }
+
+# Global instance shared by story generation and rendering
+duration_fitter = DurationFitter()
@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import shutil
+import subprocess
+from config import Config
+
+def get_ffmpeg_binary():
+    """Get the ffmpeg executable MoviePy is configured to use"""
+    try:
+        from moviepy.config import get_setting
+        return get_setting("FFMPEG_BINARY")
+    except Exception:
+        return "ffmpeg"
+
+def run_ffmpeg(args):
+    """Run ffmpeg with the given arguments, raising RuntimeError on failure"""
+    command = [get_ffmpeg_binary(), "-y", "-loglevel", "error"] + [str(arg) for arg in args]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="ignore").strip()
+        raise RuntimeError(f"ffmpeg failed: {error}")
+    return result
+
+def loop_video(input_path, output_path, duration):
+    """Repeat a video until it reaches duration seconds without re-encoding"""
+    run_ffmpeg([
+        "-stream_loop", "-1",
+        "-i", input_path,
+        "-t", f"{duration:.3f}",
+        "-c", "copy",
+        output_path
+    ])
+    return output_path
+
+def get_ffprobe_binary():
+    """Get the ffprobe executable, or None if it is not installed"""
+    return shutil.which(Config.FFPROBE_BINARY)
+
+def probe_video(path):
+    """Read duration, resolution, fps and codec of a video without decoding it"""
+    ffprobe = get_ffprobe_binary()
+    if ffprobe:
+        command = [
+            ffprobe, "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=codec_name,width,height,avg_frame_rate,r_frame_rate:format=duration",
+            "-of", "json",
+            path
+        ]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode == 0:
+            data = json.loads(result.stdout.decode("utf-8"))
+            stream = data.get("streams", [{}])[0]
+            return {
+                'duration': float(data.get("format", {}).get("duration", 0) or 0),
+                'width': int(stream.get("width", 0)),
+                'height': int(stream.get("height", 0)),
+                'fps': parse_frame_rate(stream.get("avg_frame_rate")) or parse_frame_rate(stream.get("r_frame_rate")),
+                'codec': stream.get("codec_name")
+            }
+
+    # Fall back to parsing the stream banner ffmpeg prints for its input
+    command = [get_ffmpeg_binary(), "-hide_banner", "-i", path]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = result.stderr.decode("utf-8", errors="ignore")
+
+    duration_match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    stream_match = re.search(r"Stream #\d+:\d+.*?: Video: (\w+).*?, (\d{2,5})x(\d{2,5})", output)
+    if not duration_match or not stream_match:
+        raise RuntimeError(f"Could not probe video: {path}")
+
+    hours, minutes, seconds = duration_match.groups()
+    fps_match = re.search(r"(\d+(?:\.\d+)?) fps", output[stream_match.start():])
+    return {
+        'duration': int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        'width': int(stream_match.group(2)),
+        'height': int(stream_match.group(3)),
+        'fps': float(fps_match.group(1)) if fps_match else None,
+        'codec': stream_match.group(1)
+    }
+
+def probe_keyframes(path):
+    """List keyframe timestamps (seconds) of the first video stream"""
+    ffprobe = get_ffprobe_binary()
+    if ffprobe:
+        # Packet flags are read from the container, so nothing is decoded
+        command = [
+            ffprobe, "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            path
+        ]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode == 0:
+            keyframes = []
+            for line in result.stdout.decode("utf-8").splitlines():
+                parts = line.strip().split(",")
+                if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+                    keyframes.append(float(parts[0]))
+            return sorted(keyframes)
+
+    # Without ffprobe, decode only the keyframes and read their timestamps
+    command = [
+        get_ffmpeg_binary(), "-hide_banner",
+        "-skip_frame", "nokey",
+        "-i", path,
+        "-an", "-vf", "showinfo",
+        "-f", "null", "-"
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = result.stderr.decode("utf-8", errors="ignore")
+    return sorted(float(value) for value in re.findall(r"pts_time:\s*(-?\d+(?:\.\d+)?)", output))
+
+def parse_frame_rate(value):
+    """Convert an ffprobe rate such as '30000/1001' to a float"""
+    if not value or value in ("0/0", "N/A"):
+        return None
+    if "/" in value:
+        numerator, denominator = value.split("/", 1)
+        return float(numerator) / float(denominator) if float(denominator) else None
+    return float(value)
+
+def escape_filter_path(path):
+    """Escape a file path for use as an unquoted option value inside an ffmpeg filtergraph
+
+    The value is unescaped twice, first by the filtergraph parser and then
+    by the filter's option parser, so it is escaped for both; quoting it
+    instead would break on paths that contain a quote.
+    """
+    path = os.path.abspath(path).replace("\\", "/")
+    value = re.sub(r"([\\':])", r"\\\1", path)
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
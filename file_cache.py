@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from file_lock import FileLock
+
+def link_file(path, dest_path):
+    """Atomically hard-link path to dest_path, copying where links are not supported"""
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(path, temp_path)
+    except OSError:
+        shutil.copy2(path, temp_path)
+    os.replace(temp_path, dest_path)
+    return dest_path
+
+class FileCache:
+    """Content-addressed file cache with a byte budget and LRU eviction
+
+    Worker processes can share a cache directory: every change to the
+    index holds a file lock and first merges in what other processes have
+    committed or evicted since.
+    """
+
+    def __init__(self, cache_dir, max_bytes, extension=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self.index_lock = FileLock(f"{self.index_path}.lock")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load_index()
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash any JSON-serializable parts into a stable cache key"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def read_index(self):
+        """Entries in the index file, or {} if there is none"""
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading cache index {self.index_path}: {e}")
+            return {}
+
+    def load_index(self):
+        """Load cache entries from the index file"""
+        self.entries = self.read_index()
+
+    def merge_index(self):
+        """Fold in entries other processes committed and drop files they evicted (caller holds both locks)"""
+        merged = self.read_index()
+        for key, entry in self.entries.items():
+            on_disk = merged.get(key)
+            if on_disk is None or entry.get('last_used', 0) > on_disk.get('last_used', 0):
+                merged[key] = entry
+        self.entries = {key: entry for key, entry in merged.items() if os.path.exists(self.path_for(key))}
+
+    def save_index(self):
+        """Atomically write the index file"""
+        temp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temp_path, self.index_path)
+        except Exception as e:
+            print(f"Error saving cache index {self.index_path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def path_for(self, key):
+        """Final location of a cached file"""
+        return os.path.join(self.cache_dir, f"{key}{self.extension}")
+
+    def temp_path_for(self, key):
+        """Unique scratch location to write a file before committing it"""
+        return os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.tmp{self.extension}")
+
+    def get_entry_size(self, key):
+        """Bytes on disk for key"""
+        return os.path.getsize(self.path_for(key))
+
+    def remove_entry(self, key):
+        """Delete the files of key"""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def export(self, key, dest_path):
+        """Link the cached file for key to dest_path, a copy eviction cannot remove"""
+        return link_file(self.path_for(key), dest_path)
+
+    def get(self, key, export_to=None):
+        """Return the cached file path for key, or None on a miss
+
+        With export_to the file is linked there and that path is returned
+        instead, for callers that hand it to later stages.
+        """
+        with self.lock, self.index_lock:
+            self.merge_index()
+            path = self.path_for(key)
+            if os.path.exists(path):
+                if export_to:
+                    try:
+                        path = self.export(key, export_to)
+                    except FileNotFoundError:
+                        # Evicted by another process since the check
+                        self.entries.pop(key, None)
+                        self.misses += 1
+                        return None
+                entry = self.entries.get(key)
+                if entry is None:
+                    # Written by a process that did not get to update the index
+                    entry = {'size': self.get_entry_size(key), 'created': time.time()}
+                    self.entries[key] = entry
+                entry['last_used'] = time.time()
+                self.hits += 1
+                self.save_index()
+                return path
+
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def commit(self, key, temp_path, export_to=None):
+        """Move a finished file into the cache and enforce the byte budget"""
+        with self.lock, self.index_lock:
+            self.merge_index()
+            path = self.path_for(key)
+            os.replace(temp_path, path)
+            now = time.time()
+            self.entries[key] = {
+                'size': self.get_entry_size(key),
+                'created': now,
+                'last_used': now
+            }
+            self.evict_entries(keep=key)
+            self.save_index()
+            return self.export(key, export_to) if export_to else path
+
+    def write_bytes(self, key, data, export_to=None):
+        """Atomically store raw bytes under key"""
+        temp_path = self.temp_path_for(key)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        return self.commit(key, temp_path, export_to)
+
+    def get_total_bytes(self):
+        """Total size of all cached files"""
+        return sum(entry.get('size', 0) for entry in self.entries.values())
+
+    def evict(self, keep=None):
+        """Remove least recently used files until the cache fits its budget"""
+        with self.lock, self.index_lock:
+            self.merge_index()
+            removed = self.evict_entries(keep)
+            if removed:
+                self.save_index()
+            return removed
+
+    def evict_entries(self, keep=None):
+        """Remove least recently used entries over the budget; returns how many (caller holds both locks)"""
+        total = self.get_total_bytes()
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        by_age = sorted(self.entries.items(), key=lambda item: item[1].get('last_used', 0))
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                self.remove_entry(key)
+            except Exception as e:
+                print(f"Error evicting cached file {key}: {e}")
+                continue
+            total -= entry.get('size', 0)
+            del self.entries[key]
+            removed += 1
+        return removed
+
+    def get_stats(self):
+        """Hit/miss counters and current usage"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'bytes': self.get_total_bytes(),
+                'max_bytes': self.max_bytes
+            }
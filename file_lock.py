@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """Exclusive lock shared by the threads of this process and by other processes
+
+    The lock is held on a separate .lock file so the guarded file itself
+    can be replaced atomically.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.Lock()
+        self.file = None
+
+    def acquire(self):
+        """Block until this process holds the lock"""
+        self.thread_lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, 'a+b')
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            else:
+                self.file.seek(0)
+                while True:
+                    try:
+                        # LK_LOCK gives up after about 10 seconds, so keep waiting
+                        msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except Exception:
+            if self.file:
+                self.file.close()
+                self.file = None
+            self.thread_lock.release()
+            raise
+
+    def release(self):
+        """Let the next waiter in"""
+        try:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
+            self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+def read_json(path, default=None):
+    """Parsed JSON from path, or default if it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return default
+
+def write_json(path, data):
+    """Atomically replace path with data as JSON"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
@@ -0,0 +1,86 @@
+import time
+import random
+import datetime
+import email.utils
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+class HTTPClient:
+    """Shared keep-alive HTTP session with timeouts and jittered retry backoff"""
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=None, backoff_max=None):
+        self.connect_timeout = connect_timeout or Config.HTTP_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or Config.HTTP_READ_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else Config.HTTP_MAX_RETRIES
+        self.backoff_base = backoff_base or Config.HTTP_BACKOFF_BASE
+        self.backoff_max = backoff_max or Config.HTTP_BACKOFF_MAX
+
+        pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.session = requests.Session()
+        # Retries are handled here so Retry-After and jitter apply consistently
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_retry_after(self, response):
+        """Seconds requested by a Retry-After header, or None"""
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            now = datetime.datetime.now(retry_at.tzinfo)
+            return max(0.0, (retry_at - now).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def get_retry_delay(self, attempt, response=None):
+        """Delay before retry number attempt (0-based)"""
+        retry_after = self.get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, Config.HTTP_RETRY_AFTER_MAX)
+        # Full jitter keeps parallel callers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying connection errors, timeouts, 429 and 5xx responses"""
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.get_retry_delay(attempt)
+                print(f"⚠️  Request failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in self.RETRY_STATUS_CODES and attempt < self.max_retries:
+                delay = self.get_retry_delay(attempt, response)
+                print(f"⚠️  HTTP {response.status_code}, retrying in {delay:.1f}s...")
+                response.close()
+                time.sleep(delay)
+                continue
+
+            return response
+
+    def get(self, url, **kwargs):
+        """Send a GET request"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request"""
+        return self.request("POST", url, **kwargs)
+
+# Global instance so every caller shares one connection pool
+http_client = HTTPClient()
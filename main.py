@@ -1,9 +1,7 @@
 import os
 import sys
-import time
 import random
 import datetime
-from pathlib import Path
 
 # Add current directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -11,10 +9,14 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import Config
 from api_config import api_config, setup_api_keys
 from story_generator import StoryGenerator
-from voice_generator import VoiceGenerator
+from voice_generator import VoiceGenerator, get_voice_track_path, remove_voice_track
 from background_video import BackgroundVideoManager
 from video_editor import VideoEditor
+from audio_probe import get_audio_duration, duration_estimator
+from duration_fit import duration_fitter
+from audio_processing import audio_processor
 from subtitle_assemblyai import SubtitleGenerator
+from pipeline import PipelineExecutor, PipelineJob
 
 class AutoVideoGenerator:
     def __init__(self):
@@ -54,48 +56,50 @@ class AutoVideoGenerator:
         print("✅ API keys configured!")
         return True
     
-    def generate_video(self, genre=None, continuation_id=None):
-        """Generate a single video"""
+    def generate_video(self, genre=None, continuation_id=None, story_data=None):
+        """Generate a single video, optionally from an already generated story"""
         try:
             # Generate story
-            print("\n📝 Generating story...")
-            if continuation_id:
+            if story_data:
+                print(f"\n📝 Using generated story {story_data['video_id']}...")
+            elif continuation_id:
+                print("\n📝 Generating story...")
                 story_data = self.story_generator.generate_continuation(continuation_id)
             else:
+                print("\n📝 Generating story...")
                 story_data = self.story_generator.generate_story(genre)
             
             if not story_data:
                 print("❌ Failed to generate story!")
                 return None
             
-            story_text = story_data['story']
-            video_id = story_data['video_id']
+            job = PipelineJob(0, story_data)
             
-            # Generate voice
+            # Generate voice while the background stage works
             print("🎤 Generating voice...")
-            audio_path = self.voice_generator.generate_voice(story_text, video_id)
-            if not audio_path:
-                print("❌ Failed to generate voice!")
-                return None
+            voice_stream = self.start_voice_track(story_data)
             
-            # Get background video
+            # Plan or render background video
             print("🎬 Processing background video...")
-            background_path = self.background_manager.get_random_background(
-                target_duration=Config.MAX_DURATION,
-                video_id=video_id
-            )
-            if not background_path:
+            job.segment_plan, job.background_path = self.prepare_background(story_data)
+            if not job.segment_plan and not job.background_path:
                 print("❌ Failed to get background video!")
                 return None
             
-            # Create video with subtitles
+            audio_path = voice_stream.wait()
+            if not audio_path:
+                print("❌ Failed to generate voice!")
+                self.background_manager.remove_processed_background(job.background_path)
+                return None
+            
+            job.audio_path = self.finish_voice_track(audio_path, story_data)
+            
             print("🎥 Creating final video...")
-            output_path = self.video_editor.create_video_with_subtitles(
-                audio_path=audio_path,
-                background_path=background_path,
-                story_text=story_text,
-                video_id=video_id
-            )
+            try:
+                output_path = self.render(job)
+            finally:
+                remove_voice_track(job.audio_path)
+                self.background_manager.remove_processed_background(job.background_path)
             
             if output_path:
                 print(f"✅ Video created successfully: {output_path}")
@@ -108,6 +112,96 @@ class AutoVideoGenerator:
             print(f"❌ Error generating video: {e}")
             return None
     
+    def finish_voice_track(self, audio_path, story_data):
+        """Trim silences and calibrate the duration model with the finished voice track"""
+        video_id = story_data['video_id']
+        if Config.TRIM_SILENCE:
+            trimmed_path = audio_processor.trim_silence(
+                audio_path,
+                get_voice_track_path(video_id, audio_processor.trimmed_cache.extension, "_trimmed")
+            )
+            if trimmed_path != audio_path:
+                remove_voice_track(audio_path)
+            audio_path = trimmed_path
+        
+        # Calibrate the estimator with the real speech length
+        duration_fitter.record(
+            story_data['story'],
+            get_audio_duration(audio_path),
+            video_id,
+            predicted=story_data.get('predicted_duration')
+        )
+        return audio_path
+    
+    def start_voice_track(self, story_data):
+        """Start synthesizing a story's voice in the background; returns a VoiceStream to wait on"""
+        story_text = story_data['story']
+        video_id = story_data['video_id']
+        if Config.VOICE_CHUNKED:
+            # Sentences are synthesized concurrently
+            return self.voice_generator.generate_voice_chunked_stream(story_text, video_id)
+        if Config.VOICE_STREAMING:
+            # Decoded for silence trimming as its chunks arrive
+            listeners = [audio_processor.create_stream_decoder(Config.VOICE_STREAM_FORMAT)] if Config.TRIM_SILENCE else []
+            return self.voice_generator.generate_voice_stream(story_text, video_id, listeners=listeners)
+        return self.voice_generator.generate_voice_background(story_text, video_id)
+    
+    def generate_voice_track(self, story_data):
+        """Synthesize and post-process the whole voice track for a story; None on failure"""
+        audio_path = self.start_voice_track(story_data).wait()
+        if not audio_path:
+            return None
+        return self.finish_voice_track(audio_path, story_data)
+    
+    def prepare_background(self, story_data, render_background=None):
+        """Plan or get the background for a story; returns (segment_plan, background_path)
+        
+        A single-pass plan needs no rendering. Otherwise a pre-rendered segment
+        is taken from the pool, or render_background(target_duration, video_id)
+        renders one, by default in this process. Both are None on failure.
+        """
+        video_id = story_data['video_id']
+        # Predicted speech length lets the background stage render only what is needed
+        target_duration = duration_estimator.estimate_background_duration(story_data['story'])
+        
+        if Config.SINGLE_PASS_RENDER:
+            segment_plan = self.background_manager.plan_background_segment(target_duration=target_duration)
+            if segment_plan:
+                return segment_plan, None
+        
+        background_path = self.background_manager.take_pooled_background(target_duration, video_id)
+        if not background_path:
+            render_background = render_background or self.background_manager.get_random_background
+            background_path = render_background(target_duration=target_duration, video_id=video_id)
+        return None, background_path
+    
+    def render(self, job, call_editor=None):
+        """Render the final video of a job whose voice track and background are ready
+        
+        call_editor(method, **kwargs) runs a VideoEditor method, by default on
+        this generator's editor; the pipeline runs it in a worker process.
+        """
+        if call_editor is None:
+            call_editor = lambda method, **kwargs: getattr(self.video_editor, method)(**kwargs)
+        story_text = job.story_data['story']
+        video_id = job.story_data['video_id']
+        if job.segment_plan:
+            # Decode, crop, subtitle and encode in one pass without an intermediate file
+            return call_editor(
+                'create_video_from_source',
+                audio_path=job.audio_path,
+                segment_plan=job.segment_plan,
+                story_text=story_text,
+                video_id=video_id
+            )
+        return call_editor(
+            'create_video_with_subtitles',
+            audio_path=job.audio_path,
+            background_path=job.background_path,
+            story_text=story_text,
+            video_id=video_id
+        )
+    
     def generate_batch(self, count=1, genre=None):
         """Generate multiple videos"""
         print(f"\n🚀 Starting batch generation of {count} videos...")
@@ -115,86 +209,96 @@ class AutoVideoGenerator:
         if not self.check_api_keys():
             return
         
-        successful_videos = []
+        # Pre-render background segments while stories and voices are generated
+        use_pool = Config.BACKGROUND_POOL_ENABLED and not Config.SINGLE_PASS_RENDER
+        if use_pool:
+            self.background_manager.start_pool()
         
-        for i in range(count):
-            print(f"\n--- Generating Video {i+1}/{count} ---")
-            
-            video_path = self.generate_video(genre)
-            if video_path:
-                successful_videos.append(video_path)
-            
-            # Small delay between videos
-            if i < count - 1:
-                time.sleep(2)
+        try:
+            # Stories, voices, backgrounds and renders of different videos run side by side
+            successful_videos = PipelineExecutor(self).run([genre] * count)
+        finally:
+            # The pool's worker processes must not outlive a failed or interrupted batch
+            if use_pool:
+                self.background_manager.stop_pool()
         
         print(f"\n✅ Batch complete! {len(successful_videos)}/{count} videos created successfully.")
         return successful_videos
     
-    def list_available_scripts(self):
-        """List all available scripts for continuation"""
-        scripts_dir = Path("scripts")
-        if not scripts_dir.exists():
-            print("No scripts directory found!")
-            return []
-        
-        script_files = list(scripts_dir.glob("*.json"))
-        if not script_files:
+    def list_available_scripts(self, page=1):
+        """List available scripts for continuation, one page at a time"""
+        total = self.story_generator.script_store.count()
+        if not total:
             print("No scripts found!")
             return []
         
-        print("\n📚 Available Scripts for Continuation:")
+        page_size = Config.SCRIPTS_PAGE_SIZE
+        page_count = (total + page_size - 1) // page_size
+        first_index = (page - 1) * page_size + 1
+        
+        print(f"\n📚 Available Scripts for Continuation (page {page}/{page_count}, {total} total):")
         print("-" * 50)
         
         scripts = []
-        for i, script_file in enumerate(script_files, 1):
-            try:
-                import json
-                with open(script_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                title = data.get('title', 'Untitled')
-                genre = data.get('genre', 'Unknown')
-                date = data.get('date', 'Unknown')
-                video_id = data.get('video_id', 'Unknown')
-                
-                print(f"{i}. {title}")
-                print(f"   Genre: {genre} | Date: {date} | ID: {video_id}")
-                print()
-                
-                scripts.append({
-                    'index': i,
-                    'file': script_file,
-                    'data': data
-                })
-                
-            except Exception as e:
-                print(f"Error reading {script_file}: {e}")
+        stories = self.story_generator.list_available_stories(offset=first_index - 1, limit=page_size)
+        for i, story in enumerate(stories, first_index):
+            data = story['data']
+            title = data.get('title', 'Untitled')
+            genre = data.get('genre', 'Unknown')
+            date = data.get('date', 'Unknown')
+            video_id = data.get('video_id', 'Unknown')
+            
+            print(f"{i}. {title}")
+            print(f"   Genre: {genre} | Date: {date} | ID: {video_id}")
+            print()
+            
+            scripts.append({
+                'index': i,
+                'file': story['path'],
+                'data': data
+            })
         
         return scripts
     
     def continue_story(self):
         """Continue an existing story"""
-        scripts = self.list_available_scripts()
-        if not scripts:
-            return
-        
-        try:
-            choice = int(input("\nEnter script number to continue (or 0 to cancel): "))
-            if choice == 0:
+        page = 1
+        while True:
+            scripts = self.list_available_scripts(page)
+            if not scripts:
                 return
             
-            if 1 <= choice <= len(scripts):
-                selected_script = scripts[choice - 1]
-                continuation_id = selected_script['data']['video_id']
-                
-                print(f"\nContinuing story: {selected_script['data']['title']}")
-                self.generate_video(continuation_id=continuation_id)
-            else:
-                print("❌ Invalid choice!")
+            has_next = len(scripts) == Config.SCRIPTS_PAGE_SIZE and \
+                self.story_generator.script_store.count() > scripts[-1]['index']
+            prompt = "\nEnter script number to continue"
+            prompt += ", n for the next page" if has_next else ""
+            prompt += ", p for the previous page" if page > 1 else ""
+            choice = input(prompt + " (or 0 to cancel): ").strip().lower()
+            
+            if choice == 'n' and has_next:
+                page += 1
+                continue
+            if choice == 'p' and page > 1:
+                page -= 1
+                continue
+            
+            try:
+                choice = int(choice)
+                if choice == 0:
+                    return
                 
-        except ValueError:
-            print("❌ Please enter a valid number!")
+                selected_script = next((script for script in scripts if script['index'] == choice), None)
+                if selected_script:
+                    continuation_id = selected_script['data']['video_id']
+                    
+                    print(f"\nContinuing story: {selected_script['data']['title']}")
+                    self.generate_video(continuation_id=continuation_id)
+                else:
+                    print("❌ Invalid choice!")
+                    
+            except ValueError:
+                print("❌ Please enter a valid number!")
+            return
 
 def main():
     print("🎬 Auto AI Video Generator")
@@ -209,9 +313,10 @@ def main():
         print("3. Continue existing story")
         print("4. Setup API keys")
         print("5. List available scripts")
-        print("6. Exit")
+        print("6. Show API usage")
+        print("7. Exit")
         
-        choice = input("\nEnter your choice (1-6): ").strip()
+        choice = input("\nEnter your choice (1-7): ").strip()
         
         if choice == "1":
             print("\nAvailable genres:")
@@ -268,6 +373,9 @@ def main():
             generator.list_available_scripts()
         
         elif choice == "6":
+            api_config.print_usage_report()
+        
+        elif choice == "7":
             print("👋 Goodbye!")
             break
         
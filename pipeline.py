@@ -0,0 +1,200 @@
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from voice_generator import remove_voice_track
+
+# One manager per worker process, created on first use
+_worker_objects = {}
+
+def get_worker_object(name, factory):
+    """Process-local instance of factory(), so each worker sets up its tools once"""
+    if name not in _worker_objects:
+        _worker_objects[name] = factory()
+    return _worker_objects[name]
+
+def render_background(target_duration, video_id):
+    """Render a processed background inside a worker process"""
+    from background_video import BackgroundVideoManager
+    manager = get_worker_object('background_manager', BackgroundVideoManager)
+    return manager.get_random_background(target_duration=target_duration, video_id=video_id)
+
+def run_video_editor(method, kwargs):
+    """Call a VideoEditor method inside a worker process"""
+    from video_editor import VideoEditor
+    editor = get_worker_object('video_editor', VideoEditor)
+    return getattr(editor, method)(**kwargs)
+
+class PipelineJob:
+    """One video moving through the pipeline"""
+
+    def __init__(self, index, story_data):
+        self.index = index
+        self.story_data = story_data
+        self.audio_path = None
+        self.segment_plan = None
+        self.background_path = None
+        self.error = None
+        # Voice and background run side by side; the job renders when both are done
+        self.pending_stages = 2
+        self.lock = threading.Lock()
+
+class PipelineExecutor:
+    """Run story, voice, background and render stages for many videos at once
+
+    Each stage has its own workers and a bounded input queue: threads for
+    the network-bound story and voice stages, processes for the CPU-bound
+    background and render stages. A full queue blocks the stage feeding it,
+    so the pipeline runs at the pace of its slowest stage.
+    """
+
+    STOP = object()
+
+    def __init__(self, generator, voice_workers=None, background_workers=None, render_workers=None,
+                 queue_size=None):
+        self.generator = generator
+        self.voice_workers = voice_workers or Config.PIPELINE_VOICE_WORKERS
+        self.background_workers = background_workers or Config.PIPELINE_BACKGROUND_WORKERS
+        self.render_workers = render_workers or Config.PIPELINE_RENDER_WORKERS
+        queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+
+        self.voice_queue = queue.Queue(maxsize=queue_size)
+        self.background_queue = queue.Queue(maxsize=queue_size)
+        self.render_queue = queue.Queue(maxsize=queue_size)
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.total = 0
+
+    def start_workers(self, count, target, name):
+        """Start count threads running target"""
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def run(self, genres):
+        """Generate one video per genre; returns the paths of the videos that succeeded"""
+        self.total = len(genres)
+        # Workers are started fresh rather than forked: the voice threads hold locks a fork would copy
+        context = multiprocessing.get_context("spawn")
+        background_processes = ProcessPoolExecutor(max_workers=self.background_workers, mp_context=context)
+        render_processes = ProcessPoolExecutor(max_workers=self.render_workers, mp_context=context)
+        try:
+            voice_threads = self.start_workers(self.voice_workers, self.run_voice_stage, "voice")
+            background_threads = self.start_workers(
+                self.background_workers, lambda: self.run_background_stage(background_processes), "background"
+            )
+            render_threads = self.start_workers(
+                self.render_workers, lambda: self.run_render_stage(render_processes), "render"
+            )
+
+            self.run_story_stage(genres)
+
+            # Each stage stops once the stages feeding it have drained
+            for thread in voice_threads + background_threads:
+                thread.join()
+            for _ in render_threads:
+                self.render_queue.put(self.STOP)
+            for thread in render_threads:
+                thread.join()
+        finally:
+            background_processes.shutdown(cancel_futures=True)
+            render_processes.shutdown(cancel_futures=True)
+
+        return [path for _, path in sorted(self.results)]
+
+    def run_story_stage(self, genres):
+        """Feed stories to the voice and background stages as they are generated"""
+        try:
+            stories = self.generator.story_generator.generate_stories_concurrently(genres)
+            for index, story_data in enumerate(stories):
+                print(f"\n--- Video {index + 1}/{self.total}: story {story_data['video_id']} ready ---")
+                job = PipelineJob(index, story_data)
+                self.voice_queue.put(job)
+                self.background_queue.put(job)
+        except Exception as e:
+            print(f"❌ Error in story stage: {e}")
+        finally:
+            for _ in range(self.voice_workers):
+                self.voice_queue.put(self.STOP)
+            for _ in range(self.background_workers):
+                self.background_queue.put(self.STOP)
+
+    def run_voice_stage(self):
+        """Synthesize and post-process voice tracks"""
+        while True:
+            job = self.voice_queue.get()
+            if job is self.STOP:
+                return
+            try:
+                job.audio_path = self.generator.generate_voice_track(job.story_data)
+                if not job.audio_path:
+                    job.error = "Failed to generate voice"
+            except Exception as e:
+                job.error = f"Error generating voice: {e}"
+            finally:
+                self.finish_stage(job)
+
+    def run_background_stage(self, processes):
+        """Plan or render backgrounds, rendering in a worker process when nothing is ready"""
+        def render_in_worker(target_duration, video_id):
+            return processes.submit(render_background, target_duration, video_id).result()
+
+        while True:
+            job = self.background_queue.get()
+            if job is self.STOP:
+                return
+            try:
+                job.segment_plan, job.background_path = self.generator.prepare_background(
+                    job.story_data, render_background=render_in_worker
+                )
+                if not job.segment_plan and not job.background_path:
+                    job.error = "Failed to get background video"
+            except Exception as e:
+                job.error = f"Error processing background: {e}"
+            finally:
+                self.finish_stage(job)
+
+    def finish_stage(self, job):
+        """Hand the job to the render stage once its voice and background are both done"""
+        with job.lock:
+            job.pending_stages -= 1
+            if job.pending_stages:
+                return
+        # An error escaping here would end the stage's worker thread and stall the pipeline
+        try:
+            if job.error:
+                print(f"❌ Video {job.index + 1}/{self.total} failed: {job.error}")
+                remove_voice_track(job.audio_path)
+                self.generator.background_manager.remove_processed_background(job.background_path)
+                return
+            self.render_queue.put(job)
+        except Exception as e:
+            print(f"❌ Error finishing video {job.index + 1}/{self.total}: {e}")
+
+    def run_render_stage(self, processes):
+        """Render finished videos in worker processes"""
+        while True:
+            job = self.render_queue.get()
+            if job is self.STOP:
+                return
+            video_id = job.story_data['video_id']
+            print(f"🎥 Rendering video {job.index + 1}/{self.total} ({video_id})...")
+            try:
+                output_path = self.generator.render(
+                    job, lambda method, **kwargs: processes.submit(run_video_editor, method, kwargs).result()
+                )
+            except Exception as e:
+                print(f"❌ Error rendering video {job.index + 1}/{self.total}: {e}")
+                continue
+            finally:
+                remove_voice_track(job.audio_path)
+                self.generator.background_manager.remove_processed_background(job.background_path)
+
+            if output_path:
+                print(f"✅ Video {job.index + 1}/{self.total} created: {output_path}")
+                with self.results_lock:
+                    self.results.append((job.index, output_path))
+            else:
+                print(f"❌ Failed to create video {job.index + 1}/{self.total}!")
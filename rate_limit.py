@@ -0,0 +1,74 @@
+import time
+import threading
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate tokens per second
+
+    clock defaults to time.monotonic; buckets whose state is shared between
+    processes use time.time so saved timestamps mean the same everywhere.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=None, clock=time.monotonic):
+        """Bucket allowing requests_per_minute on average with bursts of up to burst"""
+        return cls(requests_per_minute / 60.0, burst if burst is not None else max(1, requests_per_minute // 6), clock)
+
+    def refill(self):
+        """Add the tokens earned since the last update (caller holds the lock)"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; returns 0 on success or the seconds until they will be"""
+        with self.lock:
+            self.refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def get_wait_time(self, tokens=1):
+        """Seconds until tokens are available, without taking them"""
+        with self.lock:
+            self.refill()
+            if self.tokens >= tokens:
+                return 0.0
+            return (tokens - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are taken; False if that would take longer than timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reports a rate limit"""
+        with self.lock:
+            self.refill()
+            self.tokens = 0.0
+
+    def get_state(self):
+        """Current tokens and timestamp, for saving"""
+        with self.lock:
+            self.refill()
+            return {'tokens': self.tokens, 'updated': self.updated}
+
+    def set_state(self, state):
+        """Restore tokens and timestamp saved by get_state"""
+        with self.lock:
+            self.tokens = min(self.capacity, float(state.get('tokens', self.capacity)))
+            self.updated = float(state.get('updated', self.clock()))
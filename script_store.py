@@ -0,0 +1,153 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+from config import Config
+
+class ScriptStore:
+    """SQLite index of story scripts with O(1) lookups by video ID
+
+    The JSON files in scripts/ are still written for people to read and
+    edit; the database is what the app queries.
+    """
+
+    def __init__(self, db_path=None, scripts_dir="scripts"):
+        self.db_path = db_path or Config.SCRIPT_DB_PATH
+        self.scripts_dir = scripts_dir
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.create_schema()
+        if not self.get_meta('json_imported'):
+            self.import_json_files()
+
+    def create_schema(self):
+        """Create tables and indexes if they do not exist"""
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS scripts (
+                    video_id TEXT PRIMARY KEY,
+                    genre TEXT,
+                    date TEXT,
+                    original_id TEXT,
+                    title TEXT,
+                    filename TEXT,
+                    modified REAL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_scripts_genre ON scripts (genre);
+                CREATE INDEX IF NOT EXISTS idx_scripts_date ON scripts (date);
+                CREATE INDEX IF NOT EXISTS idx_scripts_original_id ON scripts (original_id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    def get_meta(self, key):
+        """Stored value for key, or None"""
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key, value):
+        """Store value under key"""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def make_row(self, story_data, filename=None, modified=None):
+        """Column values for one script"""
+        return (
+            story_data['video_id'],
+            story_data.get('genre'),
+            story_data.get('date'),
+            story_data.get('original_id'),
+            story_data.get('title'),
+            filename,
+            modified if modified is not None else datetime.datetime.now().timestamp(),
+            json.dumps(story_data, ensure_ascii=False)
+        )
+
+    def add(self, story_data, filename=None, modified=None):
+        """Insert or update one script"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO scripts (video_id, genre, date, original_id, title, filename, modified, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self.make_row(story_data, filename, modified)
+            )
+
+    def import_json_files(self):
+        """Index every script already in the scripts directory (run once per database)"""
+        rows = []
+        if os.path.isdir(self.scripts_dir):
+            for filename in os.listdir(self.scripts_dir):
+                if not filename.endswith('.json'):
+                    continue
+                filepath = os.path.join(self.scripts_dir, filename)
+                try:
+                    with open(filepath, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if data.get('video_id'):
+                        rows.append(self.make_row(data, filename, os.path.getmtime(filepath)))
+                except Exception as e:
+                    print(f"Error reading {filename}: {e}")
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scripts (video_id, genre, date, original_id, title, filename, modified, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)",
+                                    (datetime.datetime.now().isoformat(),))
+        if rows:
+            print(f"📚 Imported {len(rows)} scripts into {self.db_path}")
+        return len(rows)
+
+    def get(self, video_id):
+        """Script data for video_id, or None"""
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM scripts WHERE video_id = ?", (video_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def get_continuations(self, original_id):
+        """Scripts that continue original_id, oldest first"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM scripts WHERE original_id = ? ORDER BY date", (original_id,)
+            ).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def count(self, genre=None):
+        """Number of scripts, optionally for one genre"""
+        with self.lock:
+            if genre:
+                row = self.connection.execute("SELECT COUNT(*) AS n FROM scripts WHERE genre = ?", (genre,)).fetchone()
+            else:
+                row = self.connection.execute("SELECT COUNT(*) AS n FROM scripts").fetchone()
+        return row['n']
+
+    def list_scripts(self, offset=0, limit=None, genre=None):
+        """Page of scripts, newest first, as {'filename', 'path', 'data', 'modified'} dicts"""
+        query = "SELECT filename, modified, data FROM scripts"
+        params = []
+        if genre:
+            query += " WHERE genre = ?"
+            params.append(genre)
+        query += " ORDER BY date DESC, modified DESC LIMIT ? OFFSET ?"
+        params += [limit if limit is not None else -1, offset]
+
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        return [
+            {
+                'filename': row['filename'],
+                'path': os.path.join(self.scripts_dir, row['filename']) if row['filename'] else None,
+                'data': json.loads(row['data']),
+                'modified': datetime.datetime.fromtimestamp(row['modified'])
+            }
+            for row in rows
+        ]
@@ -0,0 +1,74 @@
+import os
+import hashlib
+from config import Config
+from file_cache import FileCache
+from file_lock import FileLock, read_json, write_json
+
+class SegmentCache(FileCache):
+    """Cache of processed 9:16 background segments keyed by source content"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        cache_dir = cache_dir or os.path.join(Config.CACHE_DIR, "segments")
+        max_bytes = max_bytes if max_bytes is not None else Config.BACKGROUND_CACHE_MAX_BYTES
+        super().__init__(cache_dir, max_bytes, extension=".mp4")
+        self.source_hashes_path = os.path.join(cache_dir, "sources.json")
+        self.source_hashes_lock = FileLock(f"{self.source_hashes_path}.lock")
+        self.source_hashes = {}
+        self.load_source_hashes()
+
+    def load_source_hashes(self):
+        """Load memoized source file hashes"""
+        self.source_hashes = read_json(self.source_hashes_path, {})
+
+    def save_source_hash(self, abs_path, entry):
+        """Add one hash to the saved ones, keeping hashes other processes saved meanwhile"""
+        try:
+            with self.source_hashes_lock:
+                self.source_hashes = {**self.source_hashes, **read_json(self.source_hashes_path, {}), abs_path: entry}
+                write_json(self.source_hashes_path, self.source_hashes)
+        except Exception as e:
+            print(f"Error saving source hashes: {e}")
+
+    def get_source_hash(self, source_path):
+        """SHA-256 of a source video, recomputed only when its mtime or size changes"""
+        with self.lock:
+            abs_path = os.path.abspath(source_path)
+            stat = os.stat(abs_path)
+            cached = self.source_hashes.get(abs_path)
+            if not cached or cached['mtime'] != stat.st_mtime or cached['size'] != stat.st_size:
+                # Another worker process may have hashed it since we loaded
+                self.load_source_hashes()
+                cached = self.source_hashes.get(abs_path)
+            if cached and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+                return cached['sha256']
+
+            digest = hashlib.sha256()
+            with open(abs_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+
+            self.save_source_hash(abs_path, {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'sha256': digest.hexdigest()
+            })
+            return digest.hexdigest()
+
+    def make_segment_key(self, source_path, start_time, duration, size=None, fps=None):
+        """Cache key for a segment of source_path rendered at size and fps"""
+        size = size or (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT)
+        fps = fps or Config.VIDEO_FPS
+        return self.make_key(
+            self.get_source_hash(source_path),
+            round(start_time, 3),
+            round(duration, 3),
+            list(size),
+            fps
+        )
+
+    def print_stats(self):
+        """Print cache hit/miss statistics"""
+        stats = self.get_stats()
+        print(f"📦 Segment cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} segments, "
+              f"{stats['bytes'] / (1024 * 1024):.1f}/{stats['max_bytes'] / (1024 * 1024):.0f} MB")
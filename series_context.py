@@ -0,0 +1,179 @@
+import re
+import json
+import time
+from collections import Counter
+from config import Config
+from text_utils import split_sentences
+
+# Words too common to say anything about what a sentence is about
+STOPWORDS = set("""
+a an and are as at be been but by did do for from had has have he her him his i if in into is it its
+just me my no not of on or our out she so than that the their them then there they this to up was we
+were what when which who will with would you your
+""".split())
+
+def get_content_words(text):
+    """Lowercased words of text that are not stopwords"""
+    return [word for word in re.findall(r"[a-z']+", text.lower()) if word not in STOPWORDS]
+
+def count_words(sentences):
+    """Total words in a list of sentences"""
+    return sum(len(sentence.split()) for sentence in sentences)
+
+def score_sentences(sentences, frequencies):
+    """Average frequency of each sentence's content words"""
+    scores = []
+    for sentence in sentences:
+        words = get_content_words(sentence)
+        scores.append(sum(frequencies[word] for word in words) / len(words) if words else 0.0)
+    return scores
+
+def extract_key_sentences(text, count):
+    """The count most representative sentences of text, in their original order"""
+    sentences = split_sentences(text)
+    if len(sentences) <= count:
+        return sentences
+    frequencies = Counter(get_content_words(text))
+    scores = score_sentences(sentences, frequencies)
+    # The opening sentence sets up the situation, so it is always kept
+    ranked = sorted(range(1, len(sentences)), key=lambda i: -scores[i])
+    keep = sorted([0] + ranked[:count - 1])
+    return [sentences[i] for i in keep]
+
+def compress_summary(parts, max_words):
+    """Drop the least representative sentences of older parts until the summary fits max_words
+
+    parts is a list of sentence lists, oldest first. The newest part is
+    never shortened because the next part continues directly from it.
+    """
+    parts = [list(sentences) for sentences in parts]
+    frequencies = Counter(word for sentences in parts for sentence in sentences
+                          for word in get_content_words(sentence))
+    while sum(count_words(sentences) for sentences in parts) > max_words:
+        candidates = [
+            (score, p, s)
+            for p, sentences in enumerate(parts[:-1])
+            for s, score in enumerate(score_sentences(sentences, frequencies))
+        ]
+        if not candidates:
+            break
+        _, p, s = min(candidates)
+        del parts[p][s]
+    return parts
+
+class SeriesContext:
+    """Rolling summaries of story series, built by following original_id links
+
+    Each part's summary is stored once in the script database and extended
+    from its parent's, so building the prompt for part N only summarizes
+    the newest part, and the prompt stays the same size however long the
+    series gets.
+    """
+
+    def __init__(self, script_store):
+        self.script_store = script_store
+        self.create_schema()
+
+    def create_schema(self):
+        """Create the summary table next to the scripts it summarizes"""
+        with self.script_store.lock, self.script_store.connection:
+            self.script_store.connection.execute("""
+                CREATE TABLE IF NOT EXISTS series_summaries (
+                    video_id TEXT PRIMARY KEY,
+                    series_id TEXT NOT NULL,
+                    part INTEGER NOT NULL,
+                    parts TEXT NOT NULL,
+                    updated REAL
+                )
+            """)
+
+    def get_chain(self, video_id):
+        """Scripts from the first part of the series up to video_id"""
+        chain = []
+        seen = set()
+        while video_id and video_id not in seen:
+            seen.add(video_id)
+            script = self.script_store.get(video_id)
+            if not script:
+                break
+            chain.append(script)
+            video_id = script.get('original_id')
+        return list(reversed(chain))
+
+    def get_cached(self, video_id):
+        """Stored (series_id, part, parts) for video_id, or None"""
+        with self.script_store.lock:
+            row = self.script_store.connection.execute(
+                "SELECT series_id, part, parts FROM series_summaries WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return (row['series_id'], row['part'], json.loads(row['parts'])) if row else None
+
+    def update(self, video_id):
+        """Summary of the series up to video_id as (series_id, part, parts), extending the parent's"""
+        cached = self.get_cached(video_id)
+        if cached:
+            return cached
+
+        chain = self.get_chain(video_id)
+        if not chain:
+            return None
+
+        # Walk back to the newest part that is already summarized
+        start = len(chain)
+        while start > 0 and not self.get_cached(chain[start - 1]['video_id']):
+            start -= 1
+        if start:
+            series_id, part, parts = self.get_cached(chain[start - 1]['video_id'])
+        else:
+            series_id, part, parts = chain[0]['video_id'], 0, []
+
+        rows = []
+        for script in chain[start:]:
+            part += 1
+            sentences = extract_key_sentences(script.get('story', ''), Config.SERIES_SENTENCES_PER_PART)
+            parts = compress_summary(parts + [sentences], Config.SERIES_SUMMARY_MAX_WORDS)
+            rows.append((script['video_id'], series_id, part, json.dumps(parts, ensure_ascii=False), time.time()))
+
+        with self.script_store.lock, self.script_store.connection:
+            self.script_store.connection.executemany(
+                "INSERT OR REPLACE INTO series_summaries (video_id, series_id, part, parts, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        return series_id, part, parts
+
+    def get_tail(self, story, max_words):
+        """Last whole sentences of story, up to max_words"""
+        tail = []
+        for sentence in reversed(split_sentences(story)):
+            if tail and count_words(tail) + len(sentence.split()) > max_words:
+                break
+            tail.insert(0, sentence)
+        return ' '.join(tail)
+
+    def build_continuation_prompt(self, video_id):
+        """Bounded-size prompt for the part after video_id, plus (series_id, part number), or None"""
+        previous = self.script_store.get(video_id)
+        summary = self.update(video_id)
+        if not previous or not summary:
+            return None
+        series_id, part, parts = summary
+        genre = previous.get('genre', 'inspiring')
+
+        # The previous part is the summary's last entry; the tail quotes it directly instead
+        story_so_far = ' '.join(sentence for sentences in parts[:-1] for sentence in sentences)
+        tail = self.get_tail(previous.get('story', ''), Config.SERIES_TAIL_WORDS)
+
+        prompt = f"This is part {part + 1} of a {genre} story series.\n\n"
+        if story_so_far:
+            prompt += f"Summary of the earlier parts:\n{story_so_far}\n\n"
+        prompt += f"""Summary of part {part}:
+{' '.join(parts[-1])}
+
+Part {part} ended with:
+"{tail}"
+
+Now write part {part + 1} of this story. Make it engaging and continue the narrative naturally.
+Keep it around 60 seconds when read aloud. Make sure it has a satisfying continuation that builds on the earlier parts.
+"""
+        return prompt, series_id, part + 1
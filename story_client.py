@@ -0,0 +1,142 @@
+import asyncio
+import queue
+import random
+import threading
+import cohere
+from config import Config
+from api_config import api_config
+from duration_fit import estimate_tokens
+
+def get_request_cost(prompt, max_tokens, num_generations=1):
+    """Most tokens a generation request can be billed"""
+    return estimate_tokens(prompt) + max_tokens * num_generations
+
+def get_billed_tokens(response, prompt, texts):
+    """Tokens Cohere billed for response, estimated from the text when it does not say"""
+    meta = getattr(response, 'meta', None)
+    billed = (meta.get('billed_units') if isinstance(meta, dict) else None) or {}
+    tokens = (billed.get('input_tokens') or 0) + (billed.get('output_tokens') or 0)
+    return tokens or estimate_tokens(prompt) + sum(estimate_tokens(text) for text in texts)
+
+class AsyncStoryClient:
+    """Keep many Cohere generations in flight under the key pool's limits and a concurrency cap"""
+
+    def __init__(self, key_pool=None, max_concurrency=None):
+        self.key_pool = key_pool or api_config.cohere_pool
+        self.max_concurrency = max_concurrency or Config.STORY_CONCURRENCY
+
+    async def acquire_lease(self, cost=0):
+        """Wait without blocking the event loop until the pool leases out a key; None if none is usable"""
+        deadline = asyncio.get_running_loop().time() + Config.KEY_LEASE_WAIT
+        while True:
+            # The pool takes a file lock and reads its state from disk, so it runs off the event loop
+            lease, wait = await asyncio.to_thread(self.key_pool.try_acquire, cost=cost)
+            if lease:
+                return lease
+            if wait is None:
+                if cost:
+                    await asyncio.to_thread(self.key_pool.has_capacity, cost)
+                return None
+            if asyncio.get_running_loop().time() + wait > deadline:
+                return None
+            await asyncio.sleep(wait)
+
+    def get_client(self, clients, api_key):
+        """Async Cohere client for api_key, created on first use"""
+        # Retries are left to the key pool and the attempts below
+        if api_key not in clients:
+            clients[api_key] = cohere.AsyncClient(api_key, check_api_key=False, max_retries=0,
+                                                  timeout=Config.HTTP_READ_TIMEOUT)
+        return clients[api_key]
+
+    async def generate_one(self, clients, semaphore, request):
+        """Generated texts for one request, or None once every attempt has failed"""
+        async with semaphore:
+            max_tokens = request.get('max_tokens', Config.STORY_MAX_TOKENS)
+            num_generations = request.get('num_generations', 1)
+            cost = get_request_cost(request['prompt'], max_tokens, num_generations)
+            for attempt in range(Config.STORY_MAX_ATTEMPTS):
+                lease = await self.acquire_lease(cost)
+                if lease is None:
+                    print("❌ No usable Cohere API key!")
+                    return None
+                try:
+                    response = await self.get_client(clients, lease.key).generate(
+                        model=Config.COHERE_MODEL,
+                        prompt=request['prompt'],
+                        max_tokens=max_tokens,
+                        temperature=request.get('temperature', 0.8),
+                        num_generations=num_generations,
+                        k=0,
+                        stop_sequences=[],
+                        return_likelihoods='NONE'
+                    )
+                    texts = [generation.text.strip() for generation in response.generations]
+                    lease.record_usage(get_billed_tokens(response, request['prompt'], texts))
+                    return texts
+                except cohere.CohereAPIError as e:
+                    status = getattr(e, 'http_status', None)
+                    if status in (401, 403):
+                        # Bad or revoked key: the pool stops leasing it out for a while
+                        await asyncio.to_thread(lease.mark_invalid)
+                    elif status == 429:
+                        await asyncio.to_thread(lease.mark_rate_limited)
+                    print(f"⚠️  Story request failed ({status}): {e}")
+                except cohere.CohereError as e:
+                    print(f"⚠️  Story request failed: {e}")
+                finally:
+                    await asyncio.to_thread(self.key_pool.release, lease)
+
+                if attempt + 1 < Config.STORY_MAX_ATTEMPTS:
+                    await asyncio.sleep(random.uniform(0, min(Config.HTTP_BACKOFF_MAX, Config.HTTP_BACKOFF_BASE * 2 ** attempt)))
+            return None
+
+    async def run(self, requests, on_result):
+        """Run every request concurrently, calling on_result(index, texts) as each completes"""
+        clients = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_request(index, request):
+            return index, await self.generate_one(clients, semaphore, request)
+
+        try:
+            tasks = [asyncio.ensure_future(run_request(i, request)) for i, request in enumerate(requests)]
+            for future in asyncio.as_completed(tasks):
+                index, texts = await future
+                on_result(index, texts)
+        finally:
+            for client in clients.values():
+                await client.close()
+
+    def generate_iter(self, requests):
+        """Yield (index, texts) for each request as soon as it completes
+
+        requests is a list of dicts with 'prompt' and optional 'max_tokens',
+        'temperature' and 'num_generations'. texts is None for failed requests.
+        """
+        if not requests:
+            return
+        if not self.key_pool.has_keys():
+            print("❌ No Cohere API key configured!")
+            for index in range(len(requests)):
+                yield index, None
+            return
+
+        results = queue.Queue()
+
+        def run_loop():
+            try:
+                asyncio.run(self.run(requests, lambda index, texts: results.put((index, texts))))
+            except Exception as e:
+                print(f"❌ Error generating stories: {e}")
+            finally:
+                results.put(None)
+
+        thread = threading.Thread(target=run_loop, daemon=True)
+        thread.start()
+        while True:
+            item = results.get()
+            if item is None:
+                break
+            yield item
+        thread.join()
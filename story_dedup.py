@@ -0,0 +1,125 @@
+import re
+import json
+import zlib
+import threading
+import numpy as np
+from config import Config
+
+# Multiply-shift hash parameters; fixed so stored signatures stay comparable across runs
+MAX_PERMUTATIONS = 256
+_random = np.random.RandomState(20240601)
+HASH_A = _random.randint(1, 2 ** 63, size=MAX_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+HASH_B = _random.randint(0, 2 ** 63, size=MAX_PERMUTATIONS, dtype=np.uint64)
+
+def get_shingles(text, size=None):
+    """CRC32 hashes of the overlapping size-word runs of text"""
+    size = size or Config.STORY_SHINGLE_SIZE
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    if len(words) < size:
+        words += [''] * (size - len(words))
+    shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                       dtype=np.uint64, count=len(shingles))
+
+def get_signature(text, num_permutations=None):
+    """MinHash signature of text as a uint32 array"""
+    num_permutations = num_permutations or Config.STORY_MINHASH_PERMUTATIONS
+    shingles = get_shingles(text)
+    # One (shingles x permutations) product; uint64 wraparound is part of the hash
+    with np.errstate(over='ignore'):
+        hashed = (shingles[:, None] * HASH_A[:num_permutations] + HASH_B[:num_permutations]) >> np.uint64(32)
+    return hashed.min(axis=0).astype(np.uint32)
+
+class StoryIndex:
+    """MinHash/LSH index of saved stories for near-duplicate checks
+
+    Signatures are kept in the script database so the index is rebuilt
+    from it at startup without re-reading every story; new scripts are
+    added as they are saved.
+    """
+
+    def __init__(self, script_store):
+        self.script_store = script_store
+        self.num_permutations = min(MAX_PERMUTATIONS, Config.STORY_MINHASH_PERMUTATIONS)
+        self.bands = Config.STORY_LSH_BANDS
+        self.rows = self.num_permutations // self.bands
+        self.signatures = {}
+        self.buckets = [{} for _ in range(self.bands)]
+        self.lock = threading.Lock()
+        self.create_schema()
+        self.load_index()
+
+    def create_schema(self):
+        """Create the signature table next to the scripts it indexes"""
+        with self.script_store.lock, self.script_store.connection:
+            self.script_store.connection.execute("""
+                CREATE TABLE IF NOT EXISTS story_signatures (
+                    video_id TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL
+                )
+            """)
+
+    def load_index(self):
+        """Load stored signatures, computing any that are missing or out of date"""
+        with self.script_store.lock:
+            rows = self.script_store.connection.execute(
+                "SELECT s.video_id, s.data, g.signature FROM scripts s "
+                "LEFT JOIN story_signatures g ON g.video_id = s.video_id"
+            ).fetchall()
+
+        missing = []
+        for row in rows:
+            signature = np.frombuffer(row['signature'], dtype=np.uint32) if row['signature'] else None
+            if signature is None or len(signature) != self.num_permutations:
+                story = json.loads(row['data']).get('story', '')
+                signature = get_signature(story, self.num_permutations)
+                missing.append((row['video_id'], signature.tobytes()))
+            self.insert(row['video_id'], signature)
+
+        if missing:
+            with self.script_store.lock, self.script_store.connection:
+                self.script_store.connection.executemany(
+                    "INSERT OR REPLACE INTO story_signatures (video_id, signature) VALUES (?, ?)", missing
+                )
+            print(f"🔎 Indexed {len(missing)} stories for duplicate detection")
+
+    def get_band_keys(self, signature):
+        """LSH bucket key of each band of signature"""
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def insert(self, video_id, signature):
+        """Add a signature to the in-memory buckets"""
+        with self.lock:
+            self.signatures[video_id] = signature
+            for bucket, key in zip(self.buckets, self.get_band_keys(signature)):
+                bucket.setdefault(key, set()).add(video_id)
+
+    def add(self, video_id, text):
+        """Index a saved story"""
+        signature = get_signature(text, self.num_permutations)
+        self.insert(video_id, signature)
+        with self.script_store.lock, self.script_store.connection:
+            self.script_store.connection.execute(
+                "INSERT OR REPLACE INTO story_signatures (video_id, signature) VALUES (?, ?)",
+                (video_id, signature.tobytes())
+            )
+
+    def find_similar(self, text, threshold=None):
+        """(video_id, estimated similarity) of the closest indexed story at or above threshold, or None"""
+        threshold = threshold if threshold is not None else Config.STORY_DUPLICATE_THRESHOLD
+        signature = get_signature(text, self.num_permutations)
+        with self.lock:
+            candidates = set()
+            for bucket, key in zip(self.buckets, self.get_band_keys(signature)):
+                candidates |= bucket.get(key, set())
+            best = None
+            for video_id in candidates:
+                similarity = float(np.mean(self.signatures[video_id] == signature))
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (video_id, similarity)
+        return best
+
+    def get_stats(self):
+        """Indexed story count"""
+        with self.lock:
+            return {'stories': len(self.signatures), 'bands': self.bands, 'rows': self.rows}
@@ -7,20 +7,62 @@ import random
 import cohere
 from config import Config
 from api_config import api_config
+from story_client import AsyncStoryClient, get_request_cost, get_billed_tokens
+from story_pool import StoryPool
+from script_store import ScriptStore
+from series_context import SeriesContext
+from duration_fit import duration_fitter
+from story_dedup import StoryIndex
 
 class StoryGenerator:
     def __init__(self):
-        self.cohere_client = None
-        self.update_cohere_client()
+        self.cohere_clients = {}
         self.ensure_directories()
+        self.script_store = ScriptStore()
+        self.series_context = SeriesContext(self.script_store)
+        self.story_index = StoryIndex(self.script_store) if Config.STORY_DEDUP_ENABLED else None
+        self.story_pool = StoryPool(self.build_story_prompt) if Config.STORY_POOL_ENABLED else None
     
-    def update_cohere_client(self):
-        """Update Cohere client with current API key"""
-        cohere_key = api_config.get_preferred_ai_key()
-        if cohere_key:
-            self.cohere_client = cohere.Client(cohere_key)
-        else:
-            self.cohere_client = None
+    def get_cohere_client(self, api_key):
+        """Cohere client for api_key, created on first use"""
+        if api_key not in self.cohere_clients:
+            self.cohere_clients[api_key] = cohere.Client(api_key, check_api_key=False)
+        return self.cohere_clients[api_key]
+    
+    def generate_text(self, prompt, max_tokens):
+        """Generate text with a leased Cohere key, failing over to other keys; None on failure"""
+        tried = set()
+        cost = get_request_cost(prompt, max_tokens)
+        for attempt in range(Config.STORY_MAX_ATTEMPTS):
+            with api_config.cohere_pool.lease(exclude=tried, cost=cost) as lease:
+                if not lease:
+                    break
+                if tried:
+                    print("🔄 Trying alternative API key...")
+                tried.add(lease.key)
+                try:
+                    response = self.get_cohere_client(lease.key).generate(
+                        model=Config.COHERE_MODEL,
+                        prompt=prompt,
+                        max_tokens=max_tokens,
+                        temperature=0.8,
+                        k=0,
+                        stop_sequences=[],
+                        return_likelihoods='NONE'
+                    )
+                    text = response.generations[0].text.strip()
+                    lease.record_usage(get_billed_tokens(response, prompt, [text]))
+                    return text
+                except cohere.CohereAPIError as e:
+                    status = getattr(e, 'http_status', None)
+                    if status == 429:
+                        lease.mark_rate_limited()
+                    elif status in (401, 403):
+                        lease.mark_invalid()
+                    print(f"❌ Cohere request failed ({status}): {e}")
+                except cohere.CohereError as e:
+                    print(f"❌ Cohere request failed: {e}")
+        return None
     
     def ensure_directories(self):
         """Ensure necessary directories exist"""
@@ -29,74 +71,136 @@ class StoryGenerator:
     
     def generate_story(self, genre="inspiring"):
         """Generate a complete story with engaging hook"""
-        if not self.cohere_client:
+        # Serve a pre-generated story when one is ready, skipping near-duplicates
+        while self.story_pool:
+            story_text = self.story_pool.pop(genre)
+            if not story_text:
+                break
+            story_data = self.build_story_data(story_text, genre)
+            if story_data:
+                print(f"✅ Story served from pool! ID: {story_data['video_id']}")
+                return story_data
+        
+        if not api_config.cohere_pool.has_keys():
             print("❌ No Cohere API key configured!")
             return None
         
         try:
-            # Get genre-specific prompts
-            genre_prompts = Config.GENRE_PROMPTS.get(genre, Config.GENRE_PROMPTS["inspiring"])
-            prompt = random.choice(genre_prompts)
-            
-            # Add powerful hook instruction
-            hook_instruction = self.get_hook_instruction(genre)
-            full_prompt = f"{hook_instruction}\n\n{prompt}"
-            
-            print(f"📝 Generating {genre} story with engaging hook...")
-            
-            response = self.cohere_client.generate(
-                model=Config.COHERE_MODEL,
-                prompt=full_prompt,
-                max_tokens=800,
-                temperature=0.8,
-                k=0,
-                stop_sequences=[],
-                return_likelihoods='NONE'
-            )
-            
-            story_text = response.generations[0].text.strip()
-            
-            if not story_text:
-                print("❌ No story generated!")
-                return None
-            
-            # Clean the story
-            cleaned_story = self.clean_story_text(story_text)
-            
-            # Generate unique video ID
-            video_id = str(uuid.uuid4())[:8]
-            
-            # Create story data
-            story_data = {
-                'story': cleaned_story,
-                'genre': genre,
-                'video_id': video_id,
-                'title': self.generate_title(cleaned_story),
-                'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'hook_type': self.get_hook_type(genre)
-            }
-            
-            # Save script
-            self.save_script(story_data)
-            
-            print(f"✅ Story generated successfully! ID: {video_id}")
-            return story_data
+            # Near-duplicates are regenerated before any voice or render work is spent on them
+            for attempt in range(Config.STORY_DEDUP_ATTEMPTS):
+                full_prompt = self.build_story_prompt(genre)
+                
+                print(f"📝 Generating {genre} story with engaging hook...")
+                
+                story_text = self.generate_text(full_prompt, duration_fitter.get_max_tokens())
+                
+                if not story_text:
+                    print("❌ No story generated!")
+                    return None
+                
+                story_data = self.build_story_data(story_text, genre)
+                if story_data:
+                    print(f"✅ Story generated successfully! ID: {story_data['video_id']}")
+                    return story_data
+            
+            print("❌ Only near-duplicate stories were generated!")
+            return None
             
         except Exception as e:
             print(f"❌ Error generating story: {e}")
-            
-            # Try to switch API key if available
-            if len(api_config.cohere_keys) > 1:
-                print("🔄 Trying alternative API key...")
-                api_config.cohere_keys.append(api_config.cohere_keys.pop(0))
-                self.update_cohere_client()
-                return self.generate_story(genre)
-            
             return None
     
+    def build_story_prompt(self, genre):
+        """Random genre prompt with the genre's hook instruction"""
+        # Get genre-specific prompts
+        genre_prompts = Config.GENRE_PROMPTS.get(genre, Config.GENRE_PROMPTS["inspiring"])
+        prompt = random.choice(genre_prompts)
+        
+        # Add powerful hook instruction
+        hook_instruction = self.get_hook_instruction(genre)
+        return f"{hook_instruction}\n\n{prompt}"
+    
+    def build_story_data(self, story_text, genre):
+        """Clean generated text, assign a video ID and save the script; None for near-duplicates"""
+        # Clean the story and cut it to the target length before it reaches TTS
+        cleaned_story = duration_fitter.fit_text(self.clean_story_text(story_text))
+        
+        if self.story_index:
+            match = self.story_index.find_similar(cleaned_story)
+            if match:
+                print(f"♻️  Story is {match[1]:.0%} similar to {match[0]}, discarding it")
+                return None
+        
+        # Generate unique video ID
+        video_id = str(uuid.uuid4())[:8]
+        
+        # Create story data
+        story_data = {
+            'story': cleaned_story,
+            'genre': genre,
+            'video_id': video_id,
+            'title': self.generate_title(cleaned_story),
+            'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'hook_type': self.get_hook_type(genre),
+            'predicted_duration': duration_fitter.predict(cleaned_story)
+        }
+        
+        # Save script
+        self.save_script(story_data)
+        return story_data
+    
+    def generate_stories_concurrently(self, genres):
+        """Generate one story per genre concurrently, yielding story data as each completes"""
+        # Pooled stories are ready now; only the rest need a round trip
+        pending = []
+        for genre in genres:
+            story_data = None
+            while self.story_pool and not story_data:
+                story_text = self.story_pool.pop(genre)
+                if not story_text:
+                    break
+                story_data = self.build_story_data(story_text, genre)
+            if story_data:
+                print(f"✅ Story served from pool! ID: {story_data['video_id']}")
+                yield story_data
+            else:
+                pending.append(genre)
+        genres = pending
+        
+        client = AsyncStoryClient()
+        for attempt in range(Config.STORY_DEDUP_ATTEMPTS):
+            if not genres:
+                return
+            if attempt:
+                print(f"🔄 Regenerating {len(genres)} near-duplicate stories...")
+            
+            requests = [
+                {'prompt': self.build_story_prompt(genre), 'max_tokens': duration_fitter.get_max_tokens(), 'temperature': 0.8}
+                for genre in genres
+            ]
+            print(f"📝 Generating {len(requests)} stories concurrently...")
+            
+            duplicates = []
+            for index, texts in client.generate_iter(requests):
+                story_text = texts[0] if texts else ""
+                if not story_text:
+                    print(f"❌ Story {index + 1} could not be generated!")
+                    continue
+                
+                story_data = self.build_story_data(story_text, genres[index])
+                if not story_data:
+                    duplicates.append(genres[index])
+                    continue
+                print(f"✅ Story generated successfully! ID: {story_data['video_id']}")
+                yield story_data
+            genres = duplicates
+        
+        if genres:
+            print(f"❌ {len(genres)} stories were only generated as near-duplicates!")
+    
     def generate_continuation(self, continuation_id):
         """Generate a continuation of an existing story"""
-        if not self.cohere_client:
+        if not api_config.cohere_pool.has_keys():
             print("❌ No Cohere API key configured!")
             return None
         
@@ -107,39 +211,25 @@ class StoryGenerator:
                 print(f"❌ No script found with ID: {continuation_id}")
                 return None
             
-            original_story = original_script['story']
             genre = original_script['genre']
             
-            # Create continuation prompt
-            continuation_prompt = f"""
-            This is a continuation of a {genre} story. The original story was:
-            
-            "{original_story}"
-            
-            Now write the next part of this story. Make it engaging and continue the narrative naturally. 
-            Keep it around 60 seconds when read aloud. Make sure it has a satisfying continuation that builds on the original story.
-            """
-            
-            print(f"📝 Generating continuation of {genre} story...")
+            # Summarize the whole series rather than pasting the previous part
+            continuation = self.series_context.build_continuation_prompt(continuation_id)
+            if not continuation:
+                print(f"❌ Could not build a series summary for script {continuation_id}")
+                return None
+            continuation_prompt, series_id, part = continuation
             
-            response = self.cohere_client.generate(
-                model=Config.COHERE_MODEL,
-                prompt=continuation_prompt,
-                max_tokens=800,
-                temperature=0.8,
-                k=0,
-                stop_sequences=[],
-                return_likelihoods='NONE'
-            )
+            print(f"📝 Generating part {part} of {genre} story...")
             
-            continuation_text = response.generations[0].text.strip()
+            continuation_text = self.generate_text(continuation_prompt, duration_fitter.get_max_tokens())
             
             if not continuation_text:
                 print("❌ No continuation generated!")
                 return None
             
-            # Clean the continuation
-            cleaned_continuation = self.clean_story_text(continuation_text)
+            # Clean the continuation and cut it to the target length before it reaches TTS
+            cleaned_continuation = duration_fitter.fit_text(self.clean_story_text(continuation_text))
             
             # Generate new video ID for continuation
             video_id = str(uuid.uuid4())[:8]
@@ -152,11 +242,15 @@ class StoryGenerator:
                 'title': f"Continuation: {original_script['title']}",
                 'date': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 'original_id': continuation_id,
-                'is_continuation': True
+                'series_id': series_id,
+                'part': part,
+                'is_continuation': True,
+                'predicted_duration': duration_fitter.predict(cleaned_continuation)
             }
             
-            # Save continuation script
+            # Save continuation script and extend the series summary while it is fresh
             self.save_script(continuation_data)
+            self.series_context.update(video_id)
             
             print(f"✅ Continuation generated successfully! ID: {video_id}")
             return continuation_data
@@ -233,6 +327,10 @@ class StoryGenerator:
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(story_data, f, indent=2, ensure_ascii=False)
             
+            self.script_store.add(story_data, filename, os.path.getmtime(filepath))
+            if self.story_index:
+                self.story_index.add(story_data['video_id'], story_data['story'])
+            
             print(f"📄 Script saved: {filename}")
             
         except Exception as e:
@@ -241,50 +339,16 @@ class StoryGenerator:
     def load_script_by_id(self, video_id):
         """Load script by video ID"""
         try:
-            scripts_dir = "scripts"
-            if not os.path.exists(scripts_dir):
-                return None
-            
-            for filename in os.listdir(scripts_dir):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(scripts_dir, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if data.get('video_id') == video_id:
-                            return data
-            
-            return None
+            return self.script_store.get(video_id)
             
         except Exception as e:
             print(f"❌ Error loading script: {e}")
             return None
     
-    def list_available_stories(self):
-        """List all available story scripts"""
+    def list_available_stories(self, offset=0, limit=None, genre=None):
+        """List story scripts, newest first, one page at a time"""
         try:
-            scripts_dir = "scripts"
-            if not os.path.exists(scripts_dir):
-                return []
-            
-            scripts = []
-            for filename in os.listdir(scripts_dir):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(scripts_dir, filename)
-                    try:
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            scripts.append({
-                                'filename': filename,
-                                'path': filepath,
-                                'data': data,
-                                'modified': datetime.datetime.fromtimestamp(os.path.getmtime(filepath))
-                            })
-                    except Exception as e:
-                        print(f"Error reading {filename}: {e}")
-            
-            # Sort by modification time (newest first)
-            scripts.sort(key=lambda x: x['modified'], reverse=True)
-            return scripts
+            return self.script_store.list_scripts(offset=offset, limit=limit, genre=genre)
             
         except Exception as e:
             print(f"❌ Error listing stories: {e}")
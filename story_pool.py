@@ -0,0 +1,124 @@
+import os
+import json
+import math
+import threading
+from config import Config
+from story_client import AsyncStoryClient
+from duration_fit import duration_fitter
+
+class StoryPool:
+    """Per-genre stock of generated stories, refilled in the background with multi-generation requests"""
+
+    def __init__(self, prompt_builder, pool_path=None, low_watermark=None, high_watermark=None,
+                 generations_per_request=None):
+        self.prompt_builder = prompt_builder
+        self.pool_path = pool_path or os.path.join(Config.CACHE_DIR, "story_pool.json")
+        self.low_watermark = low_watermark if low_watermark is not None else Config.STORY_POOL_LOW_WATERMARK
+        self.high_watermark = high_watermark if high_watermark is not None else Config.STORY_POOL_HIGH_WATERMARK
+        # Cohere returns at most 5 generations per call
+        self.generations_per_request = min(5, generations_per_request or Config.STORY_POOL_GENERATIONS)
+
+        self.stories = {}
+        self.wanted = set()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+        self.load_pool()
+
+    def load_pool(self):
+        """Load stories left over from previous runs"""
+        if not os.path.exists(self.pool_path):
+            return
+        try:
+            with open(self.pool_path, 'r', encoding='utf-8') as f:
+                self.stories = json.load(f)
+        except Exception as e:
+            print(f"Error loading story pool: {e}")
+            self.stories = {}
+
+    def save_pool(self):
+        """Atomically save the pool (caller holds the lock)"""
+        try:
+            os.makedirs(os.path.dirname(self.pool_path) or ".", exist_ok=True)
+            temp_path = f"{self.pool_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.stories, f, indent=2)
+            os.replace(temp_path, self.pool_path)
+        except Exception as e:
+            print(f"Error saving story pool: {e}")
+
+    def get_pool_key(self, genre):
+        """Genres without their own prompts share the inspiring pool, as they share its prompts"""
+        return genre if genre in Config.GENRE_PROMPTS else "inspiring"
+
+    def get_count(self, genre):
+        """Stories ready for genre"""
+        with self.condition:
+            return len(self.stories.get(self.get_pool_key(genre), []))
+
+    def pop(self, genre):
+        """Take a ready story for genre, or None; refills in the background when running low"""
+        key = self.get_pool_key(genre)
+        with self.condition:
+            stories = self.stories.get(key, [])
+            story_text = stories.pop(0) if stories else None
+            if story_text:
+                self.save_pool()
+            if len(stories) < self.low_watermark:
+                self.request_refill(key)
+        return story_text
+
+    def request_refill(self, genre):
+        """Ask the refill thread to top genre up to the high watermark"""
+        key = self.get_pool_key(genre)
+        with self.condition:
+            if len(self.stories.get(key, [])) >= self.high_watermark:
+                return
+            self.wanted.add(key)
+            if self.thread is None or not self.thread.is_alive():
+                self.stopped = False
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def stop(self):
+        """Stop the refill thread after its current requests"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def run(self):
+        """Refill wanted genres until stopped"""
+        while True:
+            with self.condition:
+                while not self.wanted and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                genre = self.wanted.pop()
+                missing = self.high_watermark - len(self.stories.get(genre, []))
+            if missing > 0:
+                self.refill(genre, missing)
+
+    def refill(self, genre, missing):
+        """Generate at least missing stories for genre"""
+        request_count = math.ceil(missing / self.generations_per_request)
+        requests = [
+            {'prompt': self.prompt_builder(genre), 'max_tokens': duration_fitter.get_max_tokens(), 'temperature': 0.8,
+             'num_generations': self.generations_per_request}
+            for _ in range(request_count)
+        ]
+        print(f"📚 Refilling {genre} story pool with {request_count} request(s)...")
+        for _, texts in AsyncStoryClient().generate_iter(requests):
+            texts = [text for text in texts or [] if text]
+            if not texts:
+                continue
+            with self.condition:
+                self.stories.setdefault(genre, []).extend(texts)
+                self.save_pool()
+                self.condition.notify_all()
+
+    def get_stats(self):
+        """Ready stories per genre"""
+        with self.condition:
+            return {genre: len(stories) for genre, stories in self.stories.items()}
@@ -1,96 +1,185 @@
 import os
-# Set ImageMagick path - users should update this for their system
-# os.environ["IMAGEMAGICK_BINARY"] = r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"
 import tempfile
 import time
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, ColorClip
+from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip, ColorClip
 from config import Config
+from subtitle_renderer import subtitle_renderer
+from subtitle_compositor import SubtitleCompositor
+from subtitle_timing import align_text_to_audio
+from subtitle_layout import layout_segments
 
-def create_simple_subtitles_from_text(text, video_duration, font_size=70, font_color='white', stroke_color='black', stroke_width=4):
-    """Create simple subtitles from text without needing transcription"""
+def create_subtitle_clip(text, start_time, duration, font_size=70, font_color='white', stroke_color='black', stroke_width=4):
+    """Create a subtitle clip rasterized in-process (no ImageMagick)"""
+    image = subtitle_renderer.render_text(
+        text,
+        max_width=Config.VIDEO_WIDTH - 80,  # Leave 40px margin on each side
+        font_size=font_size,
+        font_color=font_color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width
+    )
+    return ImageClip(image).set_position(('center', 'bottom')).set_start(start_time).set_duration(duration)
+
+def build_subtitle_segments(text, video_duration, audio_path=None, font_size=70, stroke_width=4, max_width=None):
+    """Split text into captions that fit the safe area, timed from the voice track when available"""
     print(f"Creating subtitles from text: {len(text)} characters")
     
     # Clean the text - remove any extra content
     text = clean_text_for_subtitles(text)
     
-    # Split text into simple chunks (not sentences, just word groups)
     words = text.split()
     if not words:
         words = ["Story", "content", "available", "in", "video"]
     
-    # Create 5-8 subtitle segments
-    num_segments = min(8, max(5, len(words) // 10))
-    words_per_segment = len(words) // num_segments
-    
-    segments = []
-    for i in range(0, len(words), words_per_segment):
-        segment = ' '.join(words[i:i + words_per_segment])
-        if segment.strip():
-            segments.append(segment.strip())
+    tokens = None
+    if audio_path and Config.SUBTITLE_ALIGN_TO_AUDIO:
+        tokens = align_text_to_audio(' '.join(words), audio_path)
     
-    # If we have too few segments, split more
-    if len(segments) < 3:
-        segments = []
-        for i in range(0, len(words), max(1, len(words) // 5)):
-            segment = ' '.join(words[i:i + max(1, len(words) // 5)])
-            if segment.strip():
-                segments.append(segment.strip())
+    # Captions are measured with the same advance tables the renderer draws with
+    segments = layout_segments(
+        words,
+        subtitle_renderer.get_metrics(font_size=font_size),
+        max_width or Config.VIDEO_WIDTH - 80,  # Leave 40px margin on each side
+        video_duration,
+        tokens=tokens,
+        stroke_width=stroke_width
+    )
     
     print(f"Split into {len(segments)} subtitle segments")
-    
-    # Calculate timing for each segment
-    segment_duration = video_duration / len(segments)
+    return segments
+
+def create_simple_subtitles_from_text(text, video_duration, font_size=70, font_color='white', stroke_color='black', stroke_width=4, audio_path=None):
+    """Create simple subtitles from text without needing transcription"""
     subtitle_clips = []
     
+    segments = build_subtitle_segments(text, video_duration, audio_path, font_size, stroke_width)
     for i, segment in enumerate(segments):
-        if not segment.strip():
-            continue
-            
-        start_time = i * segment_duration
-        end_time = (i + 1) * segment_duration
-        
         try:
-            # Create text clip with simpler settings
-            txt_clip = TextClip(
-                segment,
-                fontsize=font_size,
-                color=font_color,
+            txt_clip = create_subtitle_clip(
+                segment['text'],
+                segment['start'],
+                segment['end'] - segment['start'],
+                font_size=font_size,
+                font_color=font_color,
                 stroke_color=stroke_color,
-                stroke_width=stroke_width,
-                method='label',
-                size=(1080 - 80, None),  # Leave 40px margin on each side
-                align='center',
-                font='Arial-Bold'
-            ).set_position(('center', 'bottom')).set_start(start_time).set_duration(segment_duration)
+                stroke_width=stroke_width
+            )
             
             subtitle_clips.append(txt_clip)
-            print(f"Created subtitle {i+1}: {segment[:50]}...")
+            print(f"Created subtitle {i+1}: {segment['text'][:50]}...")
             
         except Exception as e:
             print(f"Error creating subtitle {i+1}: {e}")
-            # Try with simpler text
-            try:
-                simple_text = segment[:30] if len(segment) > 30 else segment
-                txt_clip = TextClip(
-                    simple_text,
-                    fontsize=60,
-                    color='white',
-                    stroke_color='black',
-                    stroke_width=3,
-                    method='label',
-                    size=(1080 - 100, None),
-                    align='center'
-                ).set_position(('center', 'bottom')).set_start(start_time).set_duration(segment_duration)
-                
-                subtitle_clips.append(txt_clip)
-                print(f"Created simple subtitle {i+1}")
-            except Exception as e2:
-                print(f"Failed to create simple subtitle {i+1}: {e2}")
-                continue
+            continue
     
     print(f"Successfully created {len(subtitle_clips)} subtitle clips")
     return subtitle_clips
 
+def create_subtitle_compositor(text, video_duration, frame_size, font_size=70, font_color='white', stroke_color='black', stroke_width=4, audio_path=None):
+    """Build a region-of-interest compositor with one overlay per subtitle segment"""
+    compositor = SubtitleCompositor(frame_size)
+    
+    segments = build_subtitle_segments(text, video_duration, audio_path, font_size, stroke_width, frame_size[0] - 80)
+    for i, segment in enumerate(segments):
+        try:
+            image = subtitle_renderer.render_text(
+                segment['text'],
+                max_width=frame_size[0] - 80,  # Leave 40px margin on each side
+                font_size=font_size,
+                font_color=font_color,
+                stroke_color=stroke_color,
+                stroke_width=stroke_width
+            )
+            compositor.add_overlay(image, segment['start'], segment['end'])
+        except Exception as e:
+            print(f"Error creating subtitle {i+1}: {e}")
+            continue
+    
+    print(f"Successfully created {len(compositor.overlays)} subtitle overlays")
+    return compositor
+
+def format_srt_time(seconds):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    milliseconds = int(round(max(0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+def format_ass_time(seconds):
+    """Format seconds as an ASS timestamp (H:MM:SS.cc)"""
+    centiseconds = int(round(max(0, seconds) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours:d}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+def to_ass_color(color):
+    """Convert a color name or hex string to ASS &HAABBGGRR format"""
+    from PIL import ImageColor
+    red, green, blue = ImageColor.getrgb(color)[:3]
+    return f"&H00{blue:02X}{green:02X}{red:02X}"
+
+def write_srt_file(segments, output_path):
+    """Write timed segments as an SRT subtitle file"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for i, segment in enumerate(segments, 1):
+            f.write(f"{i}\n")
+            f.write(f"{format_srt_time(segment['start'])} --> {format_srt_time(segment['end'])}\n")
+            f.write(f"{segment['text']}\n\n")
+    return output_path
+
+def write_ass_file(segments, output_path, frame_size=None, font_size=70, font_color='white', stroke_color='black', stroke_width=4):
+    """Write timed segments as an ASS subtitle file styled like the burned-in subtitles"""
+    width, height = frame_size or (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT)
+    font_name = subtitle_renderer.get_font(font_size=font_size).getname()[0]
+    
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",  # Lines are already broken to fit by the caption layout
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{font_name},{font_size},{to_ass_color(font_color)},{to_ass_color(font_color)},"
+        f"{to_ass_color(stroke_color)},&H00000000,-1,0,0,0,100,100,0,0,1,{stroke_width},0,2,40,40,0,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+    ]
+    for segment in segments:
+        text = segment['text'].replace('\n', '\\N').replace('{', '(').replace('}', ')')
+        lines.append(
+            f"Dialogue: 0,{format_ass_time(segment['start'])},{format_ass_time(segment['end'])},"
+            f"Default,,0,0,0,,{text}"
+        )
+    
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return output_path
+
+def export_subtitle_files(text, video_duration, base_path, frame_size=None, font_size=70, font_color='white', stroke_color='black', stroke_width=4, audio_path=None):
+    """Write .ass and .srt subtitle files for text next to base_path"""
+    width = (frame_size or (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT))[0]
+    segments = build_subtitle_segments(text, video_duration, audio_path, font_size, stroke_width, width - 80)
+    ass_path = write_ass_file(
+        segments,
+        f"{base_path}.ass",
+        frame_size=frame_size,
+        font_size=font_size,
+        font_color=font_color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width
+    )
+    srt_path = write_srt_file(segments, f"{base_path}.srt")
+    print(f"📝 Subtitle files written: {ass_path}, {srt_path}")
+    return {'ass': ass_path, 'srt': srt_path}
+
 def clean_text_for_subtitles(text):
     """Remove any unwanted content from text"""
     if not text:
@@ -159,6 +248,20 @@ def clean_text_for_subtitles(text):
     print(f"Cleaned text length: {len(cleaned_text)} characters")
     return cleaned_text.strip()
 
+def write_subtitled_video(clip, output_path, fps=None):
+    """Encode a subtitled clip with the standard Shorts settings"""
+    clip.write_videofile(
+        output_path,
+        fps=fps or Config.VIDEO_FPS,
+        codec='libx264',
+        audio_codec='aac',
+        verbose=False,
+        logger=None,
+        preset='medium',
+        ffmpeg_params=['-crf', '23']
+    )
+    return output_path
+
 def burn_subtitles_on_video(video_path, text, output_path=None, font_size=70, font_color='white', stroke_color='black', stroke_width=4):
     """Burn subtitles onto the video using provided text"""
     if output_path is None:
@@ -176,52 +279,39 @@ def burn_subtitles_on_video(video_path, text, output_path=None, font_size=70, fo
         print(f"Video duration: {video_duration} seconds")
         print(f"Video size: {video.size}")
         
-        # Create subtitle clips from text
-        print("Creating subtitle clips...")
-        subtitle_clips = create_simple_subtitles_from_text(
+        # Create subtitle overlays from text
+        print("Creating subtitle overlays...")
+        compositor = create_subtitle_compositor(
             text, 
             video_duration, 
+            video.size,
             font_size=font_size, 
             font_color=font_color, 
             stroke_color=stroke_color, 
             stroke_width=stroke_width
         )
         
-        # Create final video with subtitles
-        if subtitle_clips:
-            print("Combining video with subtitles...")
-            final = CompositeVideoClip([video] + subtitle_clips)
-            print(f"✅ Created {len(subtitle_clips)} subtitle clips")
-        else:
-            print("⚠️  No subtitle clips created, creating fallback subtitle")
+        if not compositor.overlays:
+            print("⚠️  No subtitle overlays created, creating fallback subtitle")
             # Create a simple fallback subtitle
             fallback_text = "Story content available in video"
-            fallback_clip = TextClip(
+            fallback_image = subtitle_renderer.render_text(
                 fallback_text,
-                fontsize=60,
-                color='white',
-                stroke_color='black',
-                stroke_width=3,
-                method='label',
-                size=(1080 - 100, None),
-                align='center'
-            ).set_position(('center', 'bottom')).set_start(0).set_duration(video_duration)
-            
-            final = CompositeVideoClip([video, fallback_clip])
+                max_width=video.size[0] - 100,
+                font_size=60,
+                stroke_width=3
+            )
+            compositor.add_overlay(fallback_image, 0, video_duration)
             print("✅ Created fallback subtitle")
         
+        # Blend subtitles into each frame's bottom band only
+        print("Combining video with subtitles...")
+        final = compositor.composite(video)
+        print(f"✅ Created {len(compositor.overlays)} subtitle overlays")
+        
         # Write video with high quality settings
         print("Writing subtitled video...")
-        final.write_videofile(
-            output_path, 
-            fps=video.fps, 
-            codec='libx264', 
-            audio_codec='aac',
-            verbose=False, 
-            logger=None,
-            preset='medium',
-            crf=23
-        )
+        write_subtitled_video(final, output_path, fps=video.fps)
         
         video.close()
         final.close()
@@ -235,6 +325,43 @@ def burn_subtitles_on_video(video_path, text, output_path=None, font_size=70, fo
         traceback.print_exc()
         return video_path
 
+class SubtitleGenerator:
+    """Add text subtitles to clips that are already loaded in memory"""
+    def __init__(self, font_size=70, font_color='white', stroke_color='black', stroke_width=4):
+        self.font_size = font_size
+        self.font_color = font_color
+        self.stroke_color = stroke_color
+        self.stroke_width = stroke_width
+    
+    def add_subtitles_to_video(self, video_clip, text, output_path, audio_path=None):
+        """Overlay subtitles on video_clip and encode it once to output_path"""
+        try:
+            compositor = create_subtitle_compositor(
+                text,
+                video_clip.duration,
+                video_clip.size,
+                font_size=self.font_size,
+                font_color=self.font_color,
+                stroke_color=self.stroke_color,
+                stroke_width=self.stroke_width,
+                audio_path=audio_path
+            )
+            
+            if compositor.overlays:
+                final = compositor.composite(video_clip)
+            else:
+                print("⚠️  No subtitle overlays created, writing video without subtitles")
+                final = video_clip
+            
+            write_subtitled_video(final, output_path)
+            return output_path
+            
+        except Exception as e:
+            print(f"❌ Error adding subtitles: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
 def add_subtitles_to_video_with_assemblyai(video_path, story_text=None, api_key=None):
     """Add subtitles to video - simplified version that always works"""
     print(f"Adding subtitles to video: {video_path}")
@@ -331,17 +458,7 @@ def create_test_subtitles():
         
         # Create test subtitle
         test_text = "This is a test subtitle to verify the system is working correctly. The text should be clearly visible at the bottom of the screen."
-        subtitle = TextClip(
-            test_text,
-            fontsize=70,
-            color='white',
-            stroke_color='black',
-            stroke_width=4,
-            method='label',
-            size=(1080 - 100, None),
-            align='center',
-            font='Arial-Bold'
-        ).set_position(('center', 'bottom')).set_duration(10)
+        subtitle = create_subtitle_clip(test_text, 0, 10)
         
         # Combine video and subtitle
         final = CompositeVideoClip([test_video, subtitle])
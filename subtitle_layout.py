@@ -0,0 +1,144 @@
+import string
+import threading
+from config import Config
+
+SENTENCE_PUNCTUATION = ".!?"
+
+def ends_with(word, punctuation):
+    """True if word ends in one of punctuation, ignoring closing quotes and brackets"""
+    stripped = word.rstrip("\"')]")
+    return bool(stripped) and stripped[-1] in punctuation
+
+class FontMetrics:
+    """Per-character advance table for one font at one size"""
+
+    def __init__(self, font):
+        self.font = font
+        self.lock = threading.Lock()
+        # Printable ASCII covers nearly every caption, so measure it up front
+        self.advances = {char: font.getlength(char) for char in string.printable if char.isprintable()}
+
+    def get_advance(self, char):
+        """Advance width of one character"""
+        advance = self.advances.get(char)
+        if advance is None:
+            advance = self.font.getlength(char)
+            with self.lock:
+                self.advances[char] = advance
+        return advance
+
+    def measure(self, text):
+        """Width in pixels of a single line, matching the renderer's glyph-by-glyph layout"""
+        advances = self.advances
+        return sum(advances[char] if char in advances else self.get_advance(char) for char in text)
+
+def wrap_words(words, metrics, max_width, stroke_width=0):
+    """Greedily break words into lines no wider than max_width"""
+    max_width -= 2 * stroke_width
+    space_width = metrics.measure(" ")
+    lines = []
+    current = []
+    current_width = 0
+    for word in words:
+        word_width = metrics.measure(word)
+        if current and current_width + space_width + word_width > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        elif current:
+            current.append(word)
+            current_width += space_width + word_width
+        else:
+            current, current_width = [word], word_width
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+def balance_lines(words, metrics, max_width, stroke_width=0):
+    """Split words into two lines of similar width, or None if no split fits"""
+    max_width -= 2 * stroke_width
+    space_width = metrics.measure(" ")
+    widths = [metrics.measure(word) for word in words]
+    total = sum(widths) + space_width * (len(words) - 1)
+
+    best = None
+    first_width = 0
+    for split in range(1, len(words)):
+        first_width += widths[split - 1] + (space_width if split > 1 else 0)
+        second_width = total - first_width - space_width
+        if first_width > max_width or second_width > max_width:
+            continue
+        longest = max(first_width, second_width)
+        if best is None or longest < best[0]:
+            best = (longest, split)
+    if best is None:
+        return None
+    split = best[1]
+    return [" ".join(words[:split]), " ".join(words[split:])]
+
+def layout_caption(words, metrics, max_width, stroke_width=0, max_lines=None):
+    """Lines for one caption, or None if the words need more than max_lines lines"""
+    max_lines = max_lines or Config.SUBTITLE_MAX_LINES
+    lines = wrap_words(words, metrics, max_width, stroke_width)
+    if len(lines) > max_lines:
+        return None
+    if len(lines) == 2:
+        # Even lines read faster than a long line over a single orphaned word
+        lines = balance_lines(words, metrics, max_width, stroke_width) or lines
+    return lines
+
+def break_into_captions(words, metrics, max_width, stroke_width=0, max_lines=None, max_words=None):
+    """Group consecutive word indices into captions that fit the safe area"""
+    max_words = max_words or Config.SUBTITLE_MAX_WORDS
+    captions = []
+    start = 0
+    for end in range(1, len(words) + 1):
+        if end - start > 1 and (end - start > max_words or
+                                layout_caption(words[start:end], metrics, max_width, stroke_width, max_lines) is None):
+            captions.append((start, end - 1))
+            start = end - 1
+        if ends_with(words[end - 1], SENTENCE_PUNCTUATION):
+            captions.append((start, end))
+            start = end
+    if start < len(words):
+        captions.append((start, len(words)))
+    return captions
+
+def get_reading_time(text):
+    """Seconds a viewer needs to read text"""
+    return max(Config.SUBTITLE_MIN_DURATION, len(text) / Config.SUBTITLE_READING_SPEED)
+
+def layout_segments(words, metrics, max_width, video_duration, tokens=None, stroke_width=0, max_lines=None):
+    """Timed [{text, start, end}] captions with explicit line breaks
+
+    With timed tokens each caption starts on its first word; otherwise
+    video_duration is shared out in proportion to reading time.
+    """
+    captions = break_into_captions(words, metrics, max_width, stroke_width, max_lines)
+    texts = [
+        "\n".join(layout_caption(words[start:end], metrics, max_width, stroke_width, max_lines) or
+                  wrap_words(words[start:end], metrics, max_width, stroke_width))
+        for start, end in captions
+    ]
+
+    segments = []
+    if tokens:
+        hold = Config.SUBTITLE_HOLD
+        for i, ((start, end), text) in enumerate(zip(captions, texts)):
+            caption_start = tokens[start]['start']
+            speech_end = tokens[end - 1]['end']
+            # Stay up long enough to read, but never past the next caption
+            caption_end = max(speech_end + hold, caption_start + get_reading_time(text))
+            if i + 1 < len(captions):
+                caption_end = min(caption_end, tokens[captions[i + 1][0]]['start'])
+            elif video_duration:
+                caption_end = min(caption_end, video_duration)
+            segments.append({'text': text, 'start': caption_start, 'end': max(caption_end, speech_end)})
+        return segments
+
+    reading_times = [get_reading_time(text) for text in texts]
+    scale = video_duration / sum(reading_times) if reading_times else 0
+    position = 0.0
+    for text, reading_time in zip(texts, reading_times):
+        segments.append({'text': text, 'start': position, 'end': position + reading_time * scale})
+        position += reading_time * scale
+    return segments
@@ -0,0 +1,211 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageColor
+from config import Config
+from subtitle_layout import FontMetrics, wrap_words
+
+# Tried in order when Config.SUBTITLE_FONT is not set or cannot be loaded
+FONT_CANDIDATES = [
+    "arialbd.ttf",
+    "Arial Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"
+]
+
+class SubtitleRenderer:
+    """Rasterize stroked subtitle text in-process with cached glyphs and lines"""
+
+    def __init__(self, max_cached_lines=512):
+        self.fonts = {}
+        self.metrics = {}
+        self.glyphs = {}
+        self.lines = OrderedDict()
+        self.max_cached_lines = max_cached_lines
+        self.lock = threading.RLock()
+
+    def get_font(self, font=None, font_size=70):
+        """Load a TrueType font once per (font, size)"""
+        font = font or Config.SUBTITLE_FONT
+        key = (font, font_size)
+        with self.lock:
+            if key in self.fonts:
+                return self.fonts[key]
+
+            candidates = ([font] if font else []) + FONT_CANDIDATES
+            loaded = None
+            for candidate in candidates:
+                try:
+                    loaded = ImageFont.truetype(candidate, font_size)
+                    break
+                except (OSError, IOError):
+                    continue
+
+            if loaded is None:
+                loaded = self.load_default_font(font_size)
+
+            self.fonts[key] = loaded
+            return loaded
+
+    def load_default_font(self, font_size):
+        """Pillow's built-in font, scalable on Pillow 10.1+ and a fixed-size bitmap before that"""
+        try:
+            loaded = ImageFont.load_default(size=font_size)
+        except TypeError:
+            loaded = ImageFont.load_default()
+        if hasattr(loaded, 'getmetrics'):
+            print("⚠️  No TrueType font found, using Pillow's default font for subtitles")
+        else:
+            print("⚠️  No TrueType font found, using Pillow's bitmap font; subtitles will ignore "
+                  "font_size - set SUBTITLE_FONT in config.py to a .ttf file")
+        return loaded
+
+    def get_line_metrics(self, font):
+        """(ascent, descent) of font; bitmap fonts only report a bounding box"""
+        if hasattr(font, 'getmetrics'):
+            return font.getmetrics()
+        # Bitmap glyph boxes start at the top of the line, so their full height is the ascent
+        _, _, _, bottom = font.getbbox("Ag")
+        return bottom, 0
+
+    def get_metrics(self, font=None, font_size=70):
+        """Advance table for (font, size), built once and shared with the caption layout"""
+        key = (font or Config.SUBTITLE_FONT, font_size)
+        metrics = self.metrics.get(key)
+        if metrics is None:
+            metrics = FontMetrics(self.get_font(font, font_size))
+            with self.lock:
+                metrics = self.metrics.setdefault(key, metrics)
+        return metrics
+
+    def get_glyph(self, font, font_key, char, stroke_width):
+        """Fill and stroke coverage masks for one character"""
+        key = (font_key, char, stroke_width)
+        glyph = self.glyphs.get(key)
+        if glyph is not None:
+            return glyph
+
+        left, top, right, bottom = font.getbbox(char, stroke_width=stroke_width)
+        width, height = right - left, bottom - top
+        if width > 0 and height > 0:
+            fill = Image.new('L', (width, height), 0)
+            ImageDraw.Draw(fill).text((-left, -top), char, font=font, fill=255)
+            stroke = Image.new('L', (width, height), 0)
+            ImageDraw.Draw(stroke).text(
+                (-left, -top), char, font=font, fill=255,
+                stroke_width=stroke_width, stroke_fill=255
+            )
+            fill_mask = np.asarray(fill, dtype=np.uint8)
+            stroke_mask = np.asarray(stroke, dtype=np.uint8)
+        else:
+            fill_mask = stroke_mask = None
+
+        glyph = {
+            'fill': fill_mask,
+            'stroke': stroke_mask,
+            'left': left,
+            'top': top,
+            'advance': font.getlength(char)
+        }
+        with self.lock:
+            self.glyphs[key] = glyph
+        return glyph
+
+    def measure(self, text, font=None, font_size=70):
+        """Width in pixels of a single line of text"""
+        return self.get_metrics(font, font_size).measure(text)
+
+    def wrap_text(self, text, max_width, font=None, font_size=70, stroke_width=4):
+        """Break text into lines no wider than max_width, keeping explicit line breaks"""
+        metrics = self.get_metrics(font, font_size)
+        lines = []
+        for paragraph in text.split("\n"):
+            lines.extend(wrap_words(paragraph.split(), metrics, max_width, stroke_width))
+        return lines
+
+    def render_line(self, text, font=None, font_size=70, font_color='white', stroke_color='black', stroke_width=4):
+        """RGBA image of one line of stroked text, cached across videos"""
+        key = (text, font or Config.SUBTITLE_FONT, font_size, font_color, stroke_color, stroke_width)
+        with self.lock:
+            cached = self.lines.get(key)
+            if cached is not None:
+                self.lines.move_to_end(key)
+                return cached
+
+        loaded = self.get_font(font, font_size)
+        font_key = (font or Config.SUBTITLE_FONT, font_size)
+        ascent, descent = self.get_line_metrics(loaded)
+        glyphs = [self.get_glyph(loaded, font_key, char, stroke_width) for char in text]
+
+        width = int(math.ceil(sum(glyph['advance'] for glyph in glyphs))) + 2 * stroke_width
+        height = ascent + descent + 2 * stroke_width
+        fill_alpha = np.zeros((height, width), dtype=np.uint8)
+        stroke_alpha = np.zeros((height, width), dtype=np.uint8)
+
+        pen_x = float(stroke_width)
+        for glyph in glyphs:
+            if glyph['fill'] is not None:
+                x0 = int(round(pen_x)) + glyph['left']
+                y0 = stroke_width + glyph['top']
+                self.blit_max(fill_alpha, glyph['fill'], x0, y0)
+                self.blit_max(stroke_alpha, glyph['stroke'], x0, y0)
+            pen_x += glyph['advance']
+
+        fill_rgb = np.array(ImageColor.getrgb(font_color)[:3], dtype=np.float32)
+        stroke_rgb = np.array(ImageColor.getrgb(stroke_color)[:3], dtype=np.float32)
+        coverage = fill_alpha[..., None].astype(np.float32) / 255
+
+        image = np.empty((height, width, 4), dtype=np.uint8)
+        image[..., :3] = (stroke_rgb * (1 - coverage) + fill_rgb * coverage + 0.5).astype(np.uint8)
+        image[..., 3] = np.maximum(stroke_alpha, fill_alpha)
+
+        with self.lock:
+            self.lines[key] = image
+            if len(self.lines) > self.max_cached_lines:
+                self.lines.popitem(last=False)
+        return image
+
+    @staticmethod
+    def blit_max(target, mask, x0, y0):
+        """Combine a glyph mask into target at (x0, y0), clipped to bounds"""
+        height, width = mask.shape
+        tx0, ty0 = max(0, x0), max(0, y0)
+        tx1, ty1 = min(target.shape[1], x0 + width), min(target.shape[0], y0 + height)
+        if tx0 >= tx1 or ty0 >= ty1:
+            return
+        region = mask[ty0 - y0:ty1 - y0, tx0 - x0:tx1 - x0]
+        np.maximum(target[ty0:ty1, tx0:tx1], region, out=target[ty0:ty1, tx0:tx1])
+
+    def render_text(self, text, max_width=None, font=None, font_size=70, font_color='white',
+                    stroke_color='black', stroke_width=4, line_spacing=0):
+        """RGBA image of text wrapped to max_width with centered lines"""
+        max_width = max_width or Config.VIDEO_WIDTH - 80
+        lines = self.wrap_text(text, max_width, font, font_size, stroke_width) or [""]
+        images = [
+            self.render_line(line, font, font_size, font_color, stroke_color, stroke_width)
+            for line in lines
+        ]
+
+        width = max(image.shape[1] for image in images)
+        height = sum(image.shape[0] for image in images) + line_spacing * (len(images) - 1)
+        canvas = np.zeros((height, width, 4), dtype=np.uint8)
+
+        y = 0
+        for image in images:
+            x = (width - image.shape[1]) // 2
+            canvas[y:y + image.shape[0], x:x + image.shape[1]] = image
+            y += image.shape[0] + line_spacing
+        return canvas
+
+    def get_stats(self):
+        """Sizes of the glyph and line caches"""
+        with self.lock:
+            return {'fonts': len(self.fonts), 'metrics': len(self.metrics), 'glyphs': len(self.glyphs), 'lines': len(self.lines)}
+
+# Global instance so caches are shared by every video in a batch
+subtitle_renderer = SubtitleRenderer()
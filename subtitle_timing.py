@@ -0,0 +1,150 @@
+import re
+import bisect
+import itertools
+from config import Config
+from audio_processing import audio_processor, find_silences
+from voice_generator import load_voice_timing
+from subtitle_layout import ends_with
+
+# Words ending in these are where the voice is likely to pause
+PAUSE_PUNCTUATION = ".!?,;:"
+
+def get_word_weight(word):
+    """Relative speaking time of a word, roughly proportional to its letters"""
+    return len(re.sub(r"[^\w]", "", word)) + 1
+
+def get_speech_intervals(samples, sample_rate, start=0.0, end=None, min_pause=None):
+    """(start, end) times of speech between start and end, split at pauses of at least min_pause"""
+    min_pause = min_pause if min_pause is not None else Config.SUBTITLE_MIN_PAUSE
+    first = int(start * sample_rate)
+    last = len(samples) if end is None else min(len(samples), int(end * sample_rate))
+    if last <= first:
+        return [(start, start)]
+
+    intervals = []
+    cursor = 0
+    for silence_start, silence_end in find_silences(samples[first:last], sample_rate):
+        if silence_end - silence_start < min_pause * sample_rate:
+            continue
+        if silence_start > cursor:
+            intervals.append((cursor, silence_start))
+        cursor = silence_end
+    if cursor < last - first:
+        intervals.append((cursor, last - first))
+
+    if not intervals:
+        return [(first / sample_rate, last / sample_rate)]
+    return [((first + a) / sample_rate, (first + b) / sample_rate) for a, b in intervals]
+
+class SpeechTimeline:
+    """Clock that only advances while the voice is speaking"""
+
+    def __init__(self, intervals):
+        self.intervals = intervals
+        self.offsets = [0.0]
+        for start, end in intervals:
+            self.offsets.append(self.offsets[-1] + end - start)
+        self.duration = self.offsets[-1]
+
+    def get_pauses(self):
+        """(speech position, length) of every pause between intervals"""
+        return [
+            (self.offsets[i + 1], self.intervals[i + 1][0] - self.intervals[i][1])
+            for i in range(len(self.intervals) - 1)
+        ]
+
+    def to_time(self, position, at_end=False):
+        """Real time of a speech position; at_end resolves pause boundaries to the earlier side"""
+        position = min(max(position, 0.0), self.duration)
+        if at_end:
+            index = max(0, bisect.bisect_left(self.offsets, position) - 1)
+        else:
+            index = min(len(self.intervals) - 1, bisect.bisect_right(self.offsets, position) - 1)
+        return self.intervals[index][0] + position - self.offsets[index]
+
+def align_words(words, timeline, tolerance=None):
+    """Timed tokens for words spread over timeline, with punctuation snapped to detected pauses"""
+    if not words:
+        return []
+    tolerance = tolerance if tolerance is not None else Config.SUBTITLE_SNAP_TOLERANCE
+    cumulative = list(itertools.accumulate((get_word_weight(word) for word in words), initial=0))
+
+    # Anchors map a boundary before word index to a speech position
+    anchors = {0: 0.0, len(words): timeline.duration}
+    candidates = [i + 1 for i, word in enumerate(words[:-1]) if ends_with(word, PAUSE_PUNCTUATION)]
+
+    # Longest pauses are the most reliable sentence breaks, so they claim boundaries first
+    for position, _ in sorted(timeline.get_pauses(), key=lambda pause: -pause[1]):
+        keys = sorted(anchors)
+        best = None
+        for boundary in candidates:
+            if boundary in anchors:
+                continue
+            index = bisect.bisect_left(keys, boundary)
+            lower, upper = keys[index - 1], keys[index]
+            if not anchors[lower] < position < anchors[upper]:
+                continue
+            span = cumulative[upper] - cumulative[lower]
+            expected = anchors[lower] + (cumulative[boundary] - cumulative[lower]) / span * (anchors[upper] - anchors[lower])
+            distance = abs(expected - position)
+            if distance <= tolerance and (best is None or distance < best[0]):
+                best = (distance, boundary)
+        if best:
+            anchors[best[1]] = position
+
+    tokens = []
+    keys = sorted(anchors)
+    for lower, upper in zip(keys, keys[1:]):
+        span = cumulative[upper] - cumulative[lower]
+        scale = (anchors[upper] - anchors[lower]) / span if span else 0.0
+        for i in range(lower, upper):
+            start = anchors[lower] + (cumulative[i] - cumulative[lower]) * scale
+            end = anchors[lower] + (cumulative[i + 1] - cumulative[lower]) * scale
+            tokens.append({
+                'text': words[i],
+                'start': timeline.to_time(start),
+                'end': timeline.to_time(end, at_end=True)
+            })
+    return tokens
+
+def split_words_by_sentences(words, sentences):
+    """Group words to match the sentences of a timing sidecar, or None if they disagree"""
+    counts = [len(sentence['text'].split()) for sentence in sentences]
+    if sum(counts) != len(words):
+        return None
+    groups = []
+    index = 0
+    for count in counts:
+        groups.append(words[index:index + count])
+        index += count
+    return groups
+
+def align_text_to_audio(text, audio_path):
+    """Timestamped [{text, start, end}] tokens for every word of text, or None if alignment fails"""
+    try:
+        words = text.split()
+        if not words:
+            return None
+        samples, sample_rate = audio_processor.load_pcm(audio_path)
+        total_duration = len(samples) / sample_rate
+
+        # Sentence timings from chunked synthesis are exact, so align within each sentence
+        sentences = load_voice_timing(audio_path)
+        groups = split_words_by_sentences(words, sentences) if sentences else None
+        if groups:
+            spans = [(sentence['start'], sentence['end']) for sentence in sentences]
+        else:
+            groups = [words]
+            spans = [(0.0, total_duration)]
+
+        tokens = []
+        for group, (start, end) in zip(groups, spans):
+            intervals = get_speech_intervals(samples, sample_rate, start, end)
+            tokens.extend(align_words(group, SpeechTimeline(intervals)))
+
+        print(f"🎯 Aligned {len(tokens)} words to the voice track")
+        return tokens
+
+    except Exception as e:
+        print(f"⚠️  Could not align subtitles to audio: {e}")
+        return None
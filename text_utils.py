@@ -0,0 +1,6 @@
+import re
+
+def split_sentences(text):
+    """Split cleaned text at sentence boundaries, keeping the punctuation"""
+    sentences = re.split(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+', text.strip())
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
@@ -2,7 +2,11 @@ import os
 import time
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeVideoClip
 from config import Config
-from subtitle_assemblyai import SubtitleGenerator
+from subtitle_assemblyai import SubtitleGenerator, export_subtitle_files
+from background_video import fit_clip_to_shorts
+from ffmpeg_utils import run_ffmpeg, escape_filter_path
+from audio_probe import get_audio_duration
+from duration_fit import duration_fitter
 
 class VideoEditor:
     def __init__(self):
@@ -23,8 +27,10 @@ class VideoEditor:
             audio_clip = AudioFileClip(audio_path)
             background_clip = VideoFileClip(background_path)
             
-            # Get audio duration
-            audio_duration = audio_clip.duration
+            # Get audio duration, never rendering past the Shorts limit
+            audio_duration = duration_fitter.clamp_render_duration(audio_clip.duration)
+            if audio_duration < audio_clip.duration:
+                audio_clip = audio_clip.subclip(0, audio_duration)
             
             # Trim background to match audio duration
             if background_clip.duration > audio_duration:
@@ -34,8 +40,9 @@ class VideoEditor:
                 loops_needed = int(audio_duration / background_clip.duration) + 1
                 background_clip = background_clip.loop(loops_needed).subclip(0, audio_duration)
             
-            # Resize background to match target dimensions
-            background_clip = background_clip.resize((Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT))
+            # Resize background to match target dimensions (processed segments already match)
+            if tuple(background_clip.size) != (Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT):
+                background_clip = background_clip.resize((Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT))
             
             # Set audio
             background_clip = background_clip.set_audio(audio_clip)
@@ -49,7 +56,8 @@ class VideoEditor:
             final_video = self.subtitle_generator.add_subtitles_to_video(
                 background_clip, 
                 story_text, 
-                output_path
+                output_path,
+                audio_path=audio_path
             )
             
             # Clean up
@@ -67,6 +75,136 @@ class VideoEditor:
             print(f"❌ Error creating video: {e}")
             return None
     
+    def create_video_from_source(self, audio_path, segment_plan, story_text, video_id):
+        """Render the final video straight from the raw background source in one pass"""
+        if Config.SUBTITLE_RENDERER == "ffmpeg":
+            output_path = self.create_video_with_ffmpeg_subtitles(audio_path, segment_plan, story_text, video_id)
+            if output_path:
+                return output_path
+            print("⚠️  Falling back to MoviePy subtitle rendering...")
+        
+        try:
+            print("🎬 Creating video with subtitles in a single pass...")
+            
+            audio_clip = AudioFileClip(audio_path)
+            audio_duration = duration_fitter.clamp_render_duration(audio_clip.duration)
+            if audio_duration < audio_clip.duration:
+                audio_clip = audio_clip.subclip(0, audio_duration)
+            
+            # Decode only the needed segment of the source; its own audio is replaced
+            source_clip = VideoFileClip(segment_plan['source'], audio=False)
+            start_time = min(segment_plan['start_time'], max(0, source_clip.duration - audio_duration))
+            end_time = min(source_clip.duration, start_time + audio_duration)
+            background_clip = source_clip.subclip(start_time, end_time)
+            
+            # Loop background if the source is shorter than the audio
+            if background_clip.duration < audio_duration:
+                loops_needed = int(audio_duration / background_clip.duration) + 1
+                background_clip = background_clip.loop(loops_needed).subclip(0, audio_duration)
+            
+            # Crop and scale to 9:16 as part of the same decode/encode pass
+            background_clip = fit_clip_to_shorts(background_clip)
+            background_clip = background_clip.set_audio(audio_clip)
+            
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            output_filename = f"{video_id}_{timestamp}.mp4"
+            output_path = os.path.join(Config.OUTPUT_DIR, output_filename)
+            
+            print(f"Using source segment from {start_time:.1f}s to {end_time:.1f}s...")
+            final_video = self.subtitle_generator.add_subtitles_to_video(
+                background_clip,
+                story_text,
+                output_path,
+                audio_path=audio_path
+            )
+            
+            audio_clip.close()
+            source_clip.close()
+            
+            if final_video:
+                print(f"✅ Video created successfully: {output_path}")
+                return output_path
+            else:
+                print("❌ Failed to create video with subtitles")
+                return None
+                
+        except Exception as e:
+            print(f"❌ Error creating video from source: {e}")
+            return None
+    
+    def create_video_with_ffmpeg_subtitles(self, audio_path, segment_plan, story_text, video_id):
+        """Crop, scale and burn ASS subtitles in a single ffmpeg process"""
+        subtitle_files = {}
+        try:
+            print("🎬 Creating video with ffmpeg-rendered subtitles...")
+            
+            # Read from the file headers; the audio itself is only decoded by ffmpeg
+            audio_duration = duration_fitter.clamp_render_duration(get_audio_duration(audio_path))
+            
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            output_filename = f"{video_id}_{timestamp}.mp4"
+            output_path = os.path.join(Config.OUTPUT_DIR, output_filename)
+            
+            width, height = Config.VIDEO_WIDTH, Config.VIDEO_HEIGHT
+            subtitle_files = export_subtitle_files(
+                story_text,
+                audio_duration,
+                os.path.splitext(output_path)[0],
+                frame_size=(width, height),
+                audio_path=audio_path
+            )
+            
+            subtitle_filter = f"ass=filename={escape_filter_path(subtitle_files['ass'])}"
+            if Config.SUBTITLE_FONT and os.path.isfile(Config.SUBTITLE_FONT):
+                fonts_dir = os.path.dirname(os.path.abspath(Config.SUBTITLE_FONT))
+                subtitle_filter += f":fontsdir={escape_filter_path(fonts_dir)}"
+            
+            video_filter = ",".join([
+                # Center-crop to 9:16 before scaling so only the visible area is resized
+                f"crop='min(iw,ih*{width}/{height})':'min(ih,iw*{height}/{width})'",
+                f"scale={width}:{height}",
+                "setsar=1",
+                subtitle_filter
+            ])
+            
+            args = []
+            if segment_plan['duration'] < audio_duration:
+                # Loop background if the source is shorter than the audio
+                args += ["-stream_loop", "-1"]
+            args += [
+                "-ss", f"{segment_plan['start_time']:.3f}",
+                "-i", segment_plan['source'],
+                "-i", audio_path,
+                "-map", "0:v:0",
+                "-map", "1:a:0",
+                "-t", f"{audio_duration:.3f}",
+                "-vf", video_filter,
+                "-r", Config.VIDEO_FPS,
+                "-c:v", "libx264",
+                "-preset", "medium",
+                "-crf", "23",
+                "-pix_fmt", "yuv420p",
+                "-c:a", "aac",
+                "-movflags", "+faststart",
+                output_path
+            ]
+            
+            print(f"Using source segment from {segment_plan['start_time']:.1f}s...")
+            run_ffmpeg(args)
+            
+            print(f"✅ Video created successfully: {output_path}")
+            return output_path
+            
+        except Exception as e:
+            print(f"❌ Error creating video with ffmpeg: {e}")
+            return None
+        
+        finally:
+            if not Config.KEEP_SUBTITLE_SIDECARS:
+                for path in subtitle_files.values():
+                    if os.path.exists(path):
+                        os.remove(path)
+    
     def create_video(self, background_path, audio_path, output_path):
         """Create basic video without subtitles (legacy method)"""
         try:
@@ -76,8 +214,10 @@ class VideoEditor:
             audio_clip = AudioFileClip(audio_path)
             background_clip = VideoFileClip(background_path)
             
-            # Get audio duration
-            audio_duration = audio_clip.duration
+            # Get audio duration, never rendering past the Shorts limit
+            audio_duration = duration_fitter.clamp_render_duration(audio_clip.duration)
+            if audio_duration < audio_clip.duration:
+                audio_clip = audio_clip.subclip(0, audio_duration)
             
             # Trim background to match audio duration
             if background_clip.duration > audio_duration:
@@ -1,85 +1,487 @@
 import os
-import requests
+import io
+import json
+import wave
+import struct
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from http_client import http_client
 from api_config import api_config
+from audio_cache import AudioCache, get_timing_path
+from text_utils import split_sentences
+
+# What the plain text-to-speech endpoint returns when no output_format is sent
+DEFAULT_OUTPUT_FORMAT = "mp3_44100_128"
+
+def get_pcm_sample_rate(output_format):
+    """Sample rate of an ElevenLabs pcm_* output format, or None for other formats"""
+    if output_format and output_format.startswith("pcm_"):
+        return int(output_format.split("_", 1)[1])
+    return None
+
+def write_wav_header(f, sample_rate, data_size=0xFFFFFFFF - 36, channels=1, sample_width=2):
+    """Write a 16-bit PCM WAV header; the default size marks a stream of unknown length"""
+    byte_rate = sample_rate * channels * sample_width
+    f.write(b"RIFF")
+    f.write(struct.pack("<I", min(0xFFFFFFFF, 36 + data_size)))
+    f.write(b"WAVEfmt ")
+    f.write(struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8))
+    f.write(b"data")
+    f.write(struct.pack("<I", data_size))
+
+def get_voice_track_path(video_id, extension, suffix=""):
+    """Per-video location for a voice track handed to later stages, or None without a video_id"""
+    if not video_id:
+        return None
+    return os.path.join(Config.TEMP_DIR, f"voice_{video_id}{suffix}{extension}")
+
+def remove_voice_track(audio_path):
+    """Delete a per-video voice track and its timing sidecar once the video no longer needs them"""
+    if not audio_path or os.path.dirname(os.path.abspath(audio_path)) != os.path.abspath(Config.TEMP_DIR):
+        return
+    for path in (audio_path, get_timing_path(audio_path)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def load_voice_timing(audio_path):
+    """Per-sentence [{text, start, end}] timings for a chunked voice track, or None"""
+    timing_path = get_timing_path(audio_path)
+    if not os.path.exists(timing_path):
+        return None
+    try:
+        with open(timing_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class VoiceStream:
+    """Handle for voice audio that is still downloading
+    
+    Listeners passed in see the audio as it arrives, so decoding can start
+    before the download ends: feed(data) for each chunk, restart() when the
+    download fails over to another key and starts again, and close(path,
+    error) once it ends, before wait() returns.
+    """
+    def __init__(self, path, output_format=None, listeners=None):
+        self.path = path
+        self.output_format = output_format
+        self.listeners = list(listeners or [])
+        self.bytes_written = 0
+        self.error = None
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def on_chunk(self, data):
+        """Record a chunk of audio written to disk and pass it to the listeners"""
+        with self.lock:
+            self.bytes_written += len(data)
+        for listener in self.listeners:
+            listener.feed(data)
+    
+    def restart(self):
+        """Forget the audio of a failed attempt; the next one overwrites the file"""
+        with self.lock:
+            self.bytes_written = 0
+        for listener in self.listeners:
+            listener.restart()
+    
+    def finish(self, path=None, error=None):
+        """Mark the download complete (or failed)"""
+        with self.lock:
+            if path:
+                self.path = path
+            self.error = error
+        for listener in self.listeners:
+            listener.close(None if error else self.path, error)
+        self.finished.set()
+    
+    def wait(self, timeout=None):
+        """Block until the download finishes; returns the final path or None on failure"""
+        self.finished.wait(timeout)
+        if not self.finished.is_set() or self.error:
+            return None
+        return self.path
 
 class VoiceGenerator:
     def __init__(self):
-        self.api_key = None
+        self.key_pool = api_config.elevenlabs_pool
         self.base_url = "https://api.elevenlabs.io/v1"
-        self.update_api_key()
+        self.audio_cache = AudioCache()
+        self.pcm_audio_cache = AudioCache(os.path.join(Config.CACHE_DIR, "audio", "pcm"), extension=".wav")
     
-    def update_api_key(self):
-        """Update API key from config"""
-        if api_config.elevenlabs_keys:
-            self.api_key = api_config.elevenlabs_keys[0]
-        else:
-            self.api_key = os.getenv('ELEVENLABS_API_KEY', '')
+    def report_key_error(self, lease, response):
+        """Cool a key down after a rate-limit or auth error so other requests skip it"""
+        if response.status_code == 429:
+            lease.mark_rate_limited(http_client.get_retry_after(response))
+        elif response.status_code in (401, 403):
+            lease.mark_invalid()
+    
+    def make_voice_key(self, audio_cache, cleaned_text, output_format):
+        """Cache key of a whole voice track, the same whether it was downloaded or streamed"""
+        return audio_cache.make_audio_key(
+            cleaned_text,
+            Config.ELEVENLABS_VOICE_ID,
+            Config.ELEVENLABS_MODEL_ID,
+            Config.ELEVENLABS_VOICE_SETTINGS,
+            output_format
+        )
     
     def generate_voice(self, text, video_id=None):
         """Generate voice from text using ElevenLabs"""
-        if not self.api_key:
-            print("❌ No ElevenLabs API key configured!")
-            return None
-        
         try:
             # Clean text for voice generation
             cleaned_text = self.clean_text_for_voice(text)
             
-            # Generate unique filename
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f"voice_{video_id}_{timestamp}.mp3" if video_id else f"voice_{timestamp}.mp3"
-            output_path = os.path.join(Config.TEMP_DIR, filename)
+            # Reuse audio already synthesized for the same text and voice, streamed or not
+            cache_key = self.make_voice_key(self.audio_cache, cleaned_text, DEFAULT_OUTPUT_FORMAT)
+            # Later stages get their own link to the file, so evicting the cache entry cannot pull it away
+            track_path = get_voice_track_path(video_id, self.audio_cache.extension)
+            cached_path = self.audio_cache.get(cache_key, export_to=track_path)
+            if cached_path:
+                print(f"✅ Using cached voice audio: {cached_path}")
+                self.audio_cache.print_stats()
+                return cached_path
+            
+            if not self.key_pool.has_keys():
+                print("❌ No ElevenLabs API key configured!")
+                return None
             
-            # Ensure temp directory exists
-            os.makedirs(Config.TEMP_DIR, exist_ok=True)
+            # Refuse up front rather than discovering an exhausted key from a failed request
+            if not self.key_pool.has_capacity(len(cleaned_text)):
+                return None
             
             # API request parameters
             url = f"{self.base_url}/text-to-speech/{Config.ELEVENLABS_VOICE_ID}"
             
-            headers = {
-                "Accept": "audio/mpeg",
-                "Content-Type": "application/json",
-                "xi-api-key": self.api_key
-            }
-            
             data = {
                 "text": cleaned_text,
-                "model_id": "eleven_monolingual_v1",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.5
-                }
+                "model_id": Config.ELEVENLABS_MODEL_ID,
+                "voice_settings": Config.ELEVENLABS_VOICE_SETTINGS
             }
             
             print(f"🎤 Generating voice for {len(cleaned_text)} characters...")
             
-            response = requests.post(url, json=data, headers=headers)
+            response = self.post_speech(url, data, params={"output_format": DEFAULT_OUTPUT_FORMAT})
+            if response is None:
+                return None
             
-            if response.status_code == 200:
-                with open(output_path, "wb") as f:
-                    f.write(response.content)
-                
-                print(f"✅ Voice generated successfully: {output_path}")
-                return output_path
-            else:
-                print(f"❌ Voice generation failed: {response.status_code}")
-                print(f"Response: {response.text}")
+            # Written atomically so an interrupted run never leaves a partial file
+            output_path = self.audio_cache.write_bytes(cache_key, response.content, export_to=track_path)
+            
+            print(f"✅ Voice generated successfully: {output_path}")
+            self.audio_cache.print_stats()
+            return output_path
                 
-                # Try to switch API key if available
-                if len(api_config.elevenlabs_keys) > 1:
+        except Exception as e:
+            print(f"❌ Error generating voice: {e}")
+            return None
+    
+    def post_speech(self, url, data, accept="audio/mpeg", params=None):
+        """POST a synthesis request, failing over across API keys; returns the 200 response or None"""
+        # Transient errors are retried per key by the HTTP client; anything
+        # still failing moves on to the next key the pool leases out
+        tried = set()
+        while True:
+            with self.key_pool.lease(exclude=tried, cost=len(data["text"])) as lease:
+                if not lease:
+                    return None
+                if tried:
                     print("🔄 Trying alternative API key...")
-                    api_config.elevenlabs_keys.append(api_config.elevenlabs_keys.pop(0))
-                    self.update_api_key()
-                    return self.generate_voice(text, video_id)
+                tried.add(lease.key)
+                headers = {
+                    "Accept": accept,
+                    "Content-Type": "application/json",
+                    "xi-api-key": lease.key
+                }
+                try:
+                    response = http_client.post(url, json=data, headers=headers, params=params)
+                except Exception as e:
+                    print(f"❌ Voice generation request failed: {e}")
+                    continue
+                
+                if response.status_code == 200:
+                    lease.record_usage()
+                    return response
                 
+                self.report_key_error(lease, response)
+                print(f"❌ Voice generation failed: {response.status_code}")
+                print(f"Response: {response.text}")
+    
+    def synthesize_chunk(self, text, previous_text="", next_text="", output_format=None, export_to=None):
+        """Synthesize one sentence to a cached WAV file; returns its path (or export_to) or None"""
+        output_format = output_format or Config.VOICE_CHUNK_FORMAT
+        sample_rate = get_pcm_sample_rate(output_format)
+        cache_key = self.pcm_audio_cache.make_audio_key(
+            text,
+            Config.ELEVENLABS_VOICE_ID,
+            Config.ELEVENLABS_MODEL_ID,
+            Config.ELEVENLABS_VOICE_SETTINGS,
+            [output_format, previous_text, next_text]
+        )
+        cached_path = self.pcm_audio_cache.get(cache_key, export_to=export_to)
+        if cached_path:
+            return cached_path
+        
+        url = f"{self.base_url}/text-to-speech/{Config.ELEVENLABS_VOICE_ID}"
+        data = {
+            "text": text,
+            "model_id": Config.ELEVENLABS_MODEL_ID,
+            "voice_settings": Config.ELEVENLABS_VOICE_SETTINGS
+        }
+        # Neighbouring sentences keep intonation continuous across chunks
+        if previous_text:
+            data["previous_text"] = previous_text
+        if next_text:
+            data["next_text"] = next_text
+        
+        response = self.post_speech(url, data, accept="audio/wav", params={"output_format": output_format})
+        if response is None:
+            return None
+        
+        header = io.BytesIO()
+        write_wav_header(header, sample_rate, len(response.content))
+        return self.pcm_audio_cache.write_bytes(cache_key, header.getvalue() + response.content, export_to=export_to)
+    
+    def generate_voice_chunked(self, text, video_id=None):
+        """Synthesize sentences concurrently and join them into one WAV track"""
+        try:
+            cleaned_text = self.clean_text_for_voice(text)
+            sentences = split_sentences(cleaned_text)
+            if not sentences:
+                print("❌ No text to synthesize!")
+                return None
+            
+            output_format = Config.VOICE_CHUNK_FORMAT
+            cache_key = self.pcm_audio_cache.make_audio_key(
+                cleaned_text,
+                Config.ELEVENLABS_VOICE_ID,
+                Config.ELEVENLABS_MODEL_ID,
+                Config.ELEVENLABS_VOICE_SETTINGS,
+                ["chunked", output_format, Config.VOICE_SENTENCE_GAP]
+            )
+            track_path = get_voice_track_path(video_id, self.pcm_audio_cache.extension)
+            cached_path = self.pcm_audio_cache.get(cache_key, export_to=track_path)
+            if cached_path and os.path.exists(get_timing_path(cached_path)):
+                print(f"✅ Using cached voice audio: {cached_path}")
+                self.pcm_audio_cache.print_stats()
+                return cached_path
+            
+            if not self.key_pool.has_keys():
+                print("❌ No ElevenLabs API key configured!")
+                return None
+            
+            # Sentences are leased one by one, so they may spread across keys
+            if not self.key_pool.has_capacity(len(cleaned_text), part_cost=max(map(len, sentences))):
                 return None
+            
+            print(f"🎤 Generating voice for {len(sentences)} sentences "
+                  f"({Config.VOICE_CHUNK_WORKERS} at a time)...")
+            
+            # Each chunk is linked to a scratch path so other tracks' commits cannot evict it before the join
+            scratch_paths = [self.pcm_audio_cache.temp_path_for(cache_key) for _ in sentences]
+            try:
+                with ThreadPoolExecutor(max_workers=Config.VOICE_CHUNK_WORKERS) as executor:
+                    futures = [
+                        executor.submit(
+                            self.synthesize_chunk,
+                            sentence,
+                            sentences[i - 1] if i > 0 else "",
+                            sentences[i + 1] if i + 1 < len(sentences) else "",
+                            output_format,
+                            scratch_paths[i]
+                        )
+                        for i, sentence in enumerate(sentences)
+                    ]
+                    chunk_paths = [future.result() for future in futures]
                 
+                failed = sum(1 for path in chunk_paths if not path)
+                if failed:
+                    # Finished chunks stay cached, so a retry only synthesizes the rest
+                    print(f"❌ Voice generation failed for {failed} of {len(sentences)} sentences")
+                    return None
+                
+                temp_path = self.pcm_audio_cache.temp_path_for(cache_key)
+                timing = self.join_chunks(chunk_paths, sentences, temp_path, Config.VOICE_SENTENCE_GAP)
+            finally:
+                for path in scratch_paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            # Written first so the track is committed and exported together with its timing
+            self.pcm_audio_cache.write_timing(cache_key, timing)
+            output_path = self.pcm_audio_cache.commit(cache_key, temp_path, export_to=track_path)
+            
+            print(f"✅ Voice generated successfully: {output_path}")
+            self.pcm_audio_cache.print_stats()
+            return output_path
+        
         except Exception as e:
             print(f"❌ Error generating voice: {e}")
             return None
     
+    def join_chunks(self, chunk_paths, sentences, output_path, gap=0.0):
+        """Concatenate WAV chunks with gap seconds of silence between them; returns per-sentence timing"""
+        timing = []
+        with wave.open(output_path, 'wb') as output:
+            params = None
+            frames_written = 0
+            for i, (path, sentence) in enumerate(zip(chunk_paths, sentences)):
+                with wave.open(path, 'rb') as chunk:
+                    if params is None:
+                        params = chunk.getparams()
+                        output.setnchannels(params.nchannels)
+                        output.setsampwidth(params.sampwidth)
+                        output.setframerate(params.framerate)
+                        frame_size = params.nchannels * params.sampwidth
+                        gap_frames = int(round(gap * params.framerate))
+                    elif (chunk.getnchannels(), chunk.getsampwidth(), chunk.getframerate()) != \
+                            (params.nchannels, params.sampwidth, params.framerate):
+                        raise ValueError(f"Chunk {path} does not match the first chunk's audio format")
+                    
+                    if i and gap_frames:
+                        output.writeframes(b"\x00" * (gap_frames * frame_size))
+                        frames_written += gap_frames
+                    
+                    # The header may not know the real length, so count the data read
+                    data = chunk.readframes(chunk.getnframes())
+                    frame_count = len(data) // frame_size
+                    output.writeframes(data)
+                    timing.append({
+                        "text": sentence,
+                        "start": round(frames_written / params.framerate, 3),
+                        "end": round((frames_written + frame_count) / params.framerate, 3)
+                    })
+                    frames_written += frame_count
+        return timing
+    
+    def run_in_background(self, generate, text, video_id, output_format):
+        """Run generate(text, video_id) in a thread and return a VoiceStream that finishes with it"""
+        stream = VoiceStream(None, output_format)
+        
+        def run():
+            path = generate(text, video_id)
+            stream.finish(path, error=None if path else "Voice synthesis failed")
+        
+        stream.thread = threading.Thread(target=run, daemon=True)
+        stream.thread.start()
+        return stream
+    
+    def generate_voice_chunked_stream(self, text, video_id=None):
+        """Run chunked synthesis in the background and return a VoiceStream immediately"""
+        return self.run_in_background(self.generate_voice_chunked, text, video_id, Config.VOICE_CHUNK_FORMAT)
+    
+    def generate_voice_background(self, text, video_id=None):
+        """Run generate_voice in the background and return a VoiceStream immediately"""
+        return self.run_in_background(self.generate_voice, text, video_id, DEFAULT_OUTPUT_FORMAT)
+    
+    def generate_voice_stream(self, text, video_id=None, output_format=None, listeners=None):
+        """Start streaming voice audio to disk and return a VoiceStream immediately"""
+        output_format = output_format or Config.VOICE_STREAM_FORMAT
+        sample_rate = get_pcm_sample_rate(output_format)
+        audio_cache = self.pcm_audio_cache if sample_rate else self.audio_cache
+        
+        cleaned_text = self.clean_text_for_voice(text)
+        cache_key = self.make_voice_key(audio_cache, cleaned_text, output_format)
+        
+        track_path = get_voice_track_path(video_id, audio_cache.extension)
+        cached_path = audio_cache.get(cache_key, export_to=track_path)
+        if cached_path:
+            print(f"✅ Using cached voice audio: {cached_path}")
+            audio_cache.print_stats()
+            stream = VoiceStream(cached_path, output_format, listeners)
+            stream.finish(cached_path)
+            return stream
+        
+        stream = VoiceStream(audio_cache.temp_path_for(cache_key), output_format, listeners)
+        stream.thread = threading.Thread(
+            target=self.download_voice_stream,
+            args=(stream, cleaned_text, audio_cache, cache_key, sample_rate, track_path),
+            daemon=True
+        )
+        stream.thread.start()
+        return stream
+    
+    def download_voice_stream(self, stream, cleaned_text, audio_cache, cache_key, sample_rate, track_path=None):
+        """Write streamed audio chunks to disk as they arrive"""
+        if not self.key_pool.has_keys():
+            print("❌ No ElevenLabs API key configured!")
+            stream.finish(error="No ElevenLabs API key configured")
+            return
+        
+        if not self.key_pool.has_capacity(len(cleaned_text)):
+            stream.finish(error="No ElevenLabs key has enough quota left")
+            return
+        
+        url = f"{self.base_url}/text-to-speech/{Config.ELEVENLABS_VOICE_ID}/stream"
+        data = {
+            "text": cleaned_text,
+            "model_id": Config.ELEVENLABS_MODEL_ID,
+            "voice_settings": Config.ELEVENLABS_VOICE_SETTINGS
+        }
+        
+        print(f"🎤 Streaming voice for {len(cleaned_text)} characters...")
+        error = None
+        tried = set()
+        while True:
+            with self.key_pool.lease(exclude=tried, cost=len(cleaned_text)) as lease:
+                if not lease:
+                    break
+                if tried:
+                    print("🔄 Trying alternative API key...")
+                    stream.restart()
+                tried.add(lease.key)
+                headers = {
+                    "Accept": "audio/wav" if sample_rate else "audio/mpeg",
+                    "Content-Type": "application/json",
+                    "xi-api-key": lease.key
+                }
+                data_size = 0
+                try:
+                    with http_client.post(url, json=data, headers=headers, params={"output_format": stream.output_format}, stream=True) as response:
+                        if response.status_code != 200:
+                            self.report_key_error(lease, response)
+                            error = f"Voice streaming failed: {response.status_code}"
+                            print(f"❌ {error}")
+                            continue
+                        
+                        with open(stream.path, "wb") as f:
+                            if sample_rate:
+                                write_wav_header(f, sample_rate)
+                            for chunk in response.iter_content(chunk_size=Config.VOICE_STREAM_CHUNK_SIZE):
+                                if not chunk:
+                                    continue
+                                f.write(chunk)
+                                f.flush()
+                                data_size += len(chunk)
+                                stream.on_chunk(chunk)
+                            
+                            if sample_rate:
+                                # Replace the open-ended header with the real sizes
+                                f.seek(0)
+                                write_wav_header(f, sample_rate, data_size)
+                    
+                    lease.record_usage()
+                    output_path = audio_cache.commit(cache_key, stream.path, export_to=track_path)
+                    print(f"✅ Voice streamed successfully: {output_path}")
+                    audio_cache.print_stats()
+                    stream.finish(output_path)
+                    return
+                
+                except Exception as e:
+                    error = f"Error streaming voice: {e}"
+                    print(f"❌ {error}")
+                    if data_size:
+                        # ElevenLabs bills the characters once audio starts flowing, even if the stream drops
+                        lease.record_usage()
+        
+        if os.path.exists(stream.path):
+            os.remove(stream.path)
+        stream.finish(error=error or "Voice streaming failed")
+    
     def clean_text_for_voice(self, text):
         """Clean text for better voice generation"""
         # Remove any metadata or unwanted content
@@ -106,15 +508,16 @@ class VoiceGenerator:
     
     def list_popular_voices(self):
         """List popular ElevenLabs voices"""
-        if not self.api_key:
+        if not self.key_pool.has_keys():
             print("❌ No ElevenLabs API key configured!")
             return
         
         try:
             url = f"{self.base_url}/voices"
-            headers = {"xi-api-key": self.api_key}
-            
-            response = requests.get(url, headers=headers)
+            with self.key_pool.lease() as lease:
+                if not lease:
+                    return
+                response = http_client.get(url, headers={"xi-api-key": lease.key})
             
             if response.status_code == 200:
                 voices = response.json().get("voices", [])